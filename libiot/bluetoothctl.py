@@ -26,14 +26,15 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-from . import pexpect
+from . import decoders, pexpect
 from .pexpect import Alt
+from .trace import tracer
 from .util import AbortException, Retry
+from array import array
 from aridity.config import Config
 from diapyr import types
 from diapyr.util import innerclass
-from functools import partial
-import logging, re
+import logging, re, time
 
 log = logging.getLogger(__name__)
 
@@ -43,21 +44,41 @@ def _dataregex(n):
 def _pathstr(serviceid, charid):
     return f"/service{serviceid:04x}/char{charid:04x}"
 
+scanduplicates = 'menu scan', 'transport le', 'duplicate-data on', 'back'
 set_conn_interval = _pathstr(0x21, 0x45)
-temperature_and_humidity = _pathstr(0x21, 0x35)
+temperature_and_humidity = 0x21, 0x35
+lywsd03mmc_history_index = 'ebe0ccba-7a0a-4b0c-8a1a-6ff2997da3a6'
+lywsd03mmc_history_records = 'ebe0ccbc-7a0a-4b0c-8a1a-6ff2997da3a6'
+h5075_command = '494e5445-4c4c-4923-5448-434f4d502011'
+h5075_history = '494e5445-4c4c-4923-5448-434f4d502013'
+h5075_key = 0xec88
+h5075_minutes = 20 * 24 * 60
+h5075_layout = decoders.registry['manufacturer', h5075_key]
 
 def _writearg(value):
     def parts(value):
         while value:
-            yield f"{value & 0xff:#04x}"
+            yield value & 0xff
             value >>= 8
-    return f'"{" ".join(parts(value))}"'
+    return _writebytes(parts(value))
+
+def _writebytes(data):
+    return f'"{" ".join(f"{b:#04x}" for b in data)}"'
+
+def _h5075request(start, end):
+    data = bytearray(19)
+    data[:6] = 0x33, 0x01, start >> 8, start & 0xff, end >> 8, end & 0xff
+    checksum = 0
+    for b in data:
+        checksum ^= b
+    return bytes(data) + bytes([checksum])
 
 class BluetoothShell:
 
     connectok = Alt.plain('Connection successful')
     connectfail = Alt.plain('Failed to connect: org.bluez.Error.Failed')
     notifyfail = Alt.plain('No attribute selected')
+    h5075advertisement = Alt.matchends(f"Device ([0-9A-F]{{2}}(?::[0-9A-F]{{2}}){{5}}) ManufacturerData Key: {h5075_key:#06x}", r'Device \1 ManufacturerData Value:', f"({_dataregex(h5075_layout.struct.size)})")
 
     @innerclass
     class Process(pexpect.Process):
@@ -77,7 +98,8 @@ class BluetoothShell:
 
     def _withprocess(f):
         def g(self, address, *args, **kwargs):
-            process = self.Process(address)
+            with tracer.phase('spawn'):
+                process = self.Process(address)
             try:
                 result = f(process, address, *args, **kwargs)
                 log.info("[%s] Done.", address)
@@ -92,40 +114,205 @@ class BluetoothShell:
         self.root = f"/org/bluez/{config.adapter}"
         self.retry = retry
 
-    @_withprocess
-    def read_lywsd03mmc(self, address):
-        basepath = f"{self.root}/dev_{address.replace(':', '_')}"
-        datapath = basepath + temperature_and_humidity
-        while True:
-            log.info("[%s] Connect.", address)
-            self.print(f"connect {address}")
-            a = self.expect(self.connectok, self.connectfail, Alt.plain(f"Device {address} not available"))
-            if a is self.connectok:
-                break
+    @innerclass
+    class GattSession:
+        'Step-wise session with one device. Each attempt resumes from the step that failed, keeping the process, connection and subscription made so far.'
+
+        idle = 5
+
+        def __init__(self, address):
+            self.address = address
+            self.devicepath = f"{self.root}/dev_{address.replace(':', '_')}"
+            self.valueheader = f"Attribute {re.escape(self.devicepath)}/service[0-9a-f]{{4}}/char[0-9a-f]{{4}} Value:"
+            self.process = None
+            self.step = self._spawn
+            self.scanning = False
+
+        def __call__(self):
+            while True:
+                step = self.step
+                result = step()
+                if step == self._read:
+                    return result
+
+        def _spawn(self):
+            with tracer.phase('spawn'):
+                self.process = self.Process(self.address)
+            self.step = self._connect
+
+        def _connect(self):
+            log.info("[%s] Connect.", self.address)
+            with tracer.phase('connect'):
+                self.process.print(f"connect {self.address}")
+                a = self.process.expect(self.connectok, self.connectfail, Alt.plain(f"Device {self.address} not available"))
             if a is self.connectfail:
                 raise AbortException('Failed to connect.')
-            log.info("[%s] Unknown device, try scan.", address)
-            self.print('scan on')
-            self.expect(Alt.plain(f"Device {address} LYWSD03MMC"))
-            self.print('scan off')
-        log.info("[%s] Read data.", address)
-        self.print('menu gatt', f"select-attribute {basepath}{set_conn_interval}", f"write {_writearg(500)}", f"select-attribute {datapath}", 'notify on')
-        if self.notifyfail is self.expect(self.notifyfail, Alt.matchends(f"Attribute {re.escape(datapath)} Value:", f"({_dataregex(5)})")):
-            raise AbortException('Disconnected.')
-        result = decode_lywsd03mmc(self.getdata(1))
-        self.print('back')
+            self.step = self._subscribe if a is self.connectok else self._scan
+
+        def _scan(self):
+            log.info("[%s] Unknown device, try scan.", self.address)
+            with tracer.phase('scan'):
+                if not self.scanning:
+                    self.process.print('scan on')
+                    self.scanning = True
+                self.process.expect(Alt.plain(f"Device {self.address} {self.advertisedname}"))
+                self.process.print('scan off')
+                self.scanning = False
+            self.step = self._connect
+
+        def _notification(self, *lines):
+            'Wait for a notification from any characteristic of the device, whose hex dump is matched by the given line patterns. A link that dropped silently is only noticed as a timeout, after which the next attempt reconnects.'
+            try:
+                a = self.process.expect(self.notifyfail, Alt.matchends(self.valueheader, *lines))
+            except AbortException:
+                log.warning("[%s] Silent, reconnect.", self.address)
+                self.process.print('back', f"disconnect {self.address}")
+                self.step = self._connect
+                raise
+            if a is self.notifyfail:
+                self.process.print('back')
+                self.step = self._connect
+                raise AbortException('Disconnected.')
+
+        def _collect(self, *lines):
+            'Gather notifications until the device has been quiet for the idle period.'
+            alt = Alt.matchends(self.valueheader, *lines)
+            while self.process.poll(alt, self.idle) is not None:
+                self.chunks.append(bytes.fromhex(' '.join(self.process.grouptext(i) for i in range(1, len(lines) + 1))))
+
+        def dispose(self):
+            if self.process is None:
+                return
+            try:
+                if self.step in {self._subscribe, self._read}:
+                    self.process.print('back')
+                    try:
+                        with tracer.phase('disconnect'):
+                            self.process.disconnect(self.address)
+                    except AbortException:
+                        log.debug("[%s] Leak connection temporarily.", self.address)
+                log.info("[%s] Done.", self.address)
+            finally:
+                self.process.dispose()
+
+    class LYWSD03MMC(GattSession):
+
+        advertisedname = 'LYWSD03MMC'
+        layout = decoders.registry['gatt', *temperature_and_humidity]
+
+        def _subscribe(self):
+            log.info("[%s] Read data.", self.address)
+            self.process.print('menu gatt', f"select-attribute {self.devicepath}{set_conn_interval}", f"write {_writearg(500)}", f"select-attribute {self.devicepath}{_pathstr(*temperature_and_humidity)}", 'notify on')
+            self.step = self._read
+
+        def _read(self):
+            with tracer.phase('notify'):
+                self._notification(f"({_dataregex(self.layout.struct.size)})")
+            return self.layout.decode(self.process.getdata(1))
+
+    class LYWSD03MMCHistory(LYWSD03MMC):
+        'Download the hourly records stored on the sensor after the given index, or all of them, as columns.'
+
+        cursor = 'index'
+        layout = decoders.registry['gatt', lywsd03mmc_history_records]
+
+        def __init__(self, address, since):
+            super().__init__(address)
+            self.since = -1 if since is None else since
+            self.chunks = []
+
+        def _subscribe(self):
+            log.info("[%s] Download history after: %s", self.address, self.since)
+            self.process.print('menu gatt', f"select-attribute {lywsd03mmc_history_index}", f"write {_writebytes((self.since + 1).to_bytes(4, 'little'))}", f"select-attribute {lywsd03mmc_history_records}", 'notify on')
+            self.step = self._read
+
+        def _read(self):
+            with tracer.phase('history'):
+                self._collect(f"({_dataregex(self.layout.struct.size)})")
+            return self.layout.decodeall(b''.join(self.chunks))
+
+    class H5075History(GattSession):
+        'Download the per-minute records stored on the sensor since the given time, or all of them, as columns.'
+
+        advertisedname = 'GVH5075'
+        cursor = 'timestamp'
+        layout = decoders.registry['gatt', h5075_history]
+
+        def __init__(self, address, since):
+            super().__init__(address)
+            self.since = since
+            self.chunks = []
+
+        def _minutes(self, now):
+            return h5075_minutes if self.since is None else min(h5075_minutes, int(now - self.since) // 60 - 1)
+
+        def __call__(self):
+            if self._minutes(time.time() // 60 * 60) < 1:
+                return dict(self.layout.decodeall(b''), timestamp = array('d'))
+            return super().__call__()
+
+        def _subscribe(self):
+            'The device counts offsets back from when it receives the request, so take the time just before writing it.'
+            self.now = time.time() // 60 * 60
+            minutes = self._minutes(self.now)
+            log.info("[%s] Download history of minutes: %s", self.address, minutes)
+            self.process.print('menu gatt', f"select-attribute {h5075_history}", 'notify on', f"select-attribute {h5075_command}", f"write {_writebytes(_h5075request(minutes, 1))}")
+            self.step = self._read
+
+        def _read(self):
+            with tracer.phase('history'):
+                self._collect(f"({_dataregex(16)})[^\r\n]*", f"({_dataregex(4)})")
+            records = bytearray()
+            timestamps = array('d')
+            for chunk in self.chunks:
+                offset = int.from_bytes(chunk[:2], 'big')
+                for i in range(6):
+                    record = chunk[2 + i * 3:5 + i * 3]
+                    if b'\xff\xff\xff' != record and 0 < offset - i:
+                        records += b'\0' + record
+                        timestamps.append(self.now - (offset - i) * 60)
+            return dict(self.layout.decodeall(records), timestamp = timestamps)
+
+    def read_lywsd03mmc(self, address):
+        reader = self.LYWSD03MMC(address)
         try:
-            self.disconnect(address)
-        except AbortException:
-            log.debug("[%s] Leak connection temporarily.", address)
-        return result
+            return reader()
+        finally:
+            reader.dispose()
 
     @_withprocess
     def read_h5075(self, address):
         log.info("[%s] Scan.", address)
-        self.print('scan on') # FIXME LATER: Allow duplicates somehow.
-        self.expect(Alt.matchends(f"Device {re.escape(address)} ManufacturerData Key: 0xec88", f"Device {re.escape(address)} ManufacturerData Value:", f"({_dataregex(6)})"))
-        return decode_h5075(self.getdata(1))
+        with tracer.phase('scan'):
+            self.print(*scanduplicates, 'scan on')
+            self.expect(Alt.matchends(f"Device {re.escape(address)} ManufacturerData Key: {h5075_key:#06x}", f"Device {re.escape(address)} ManufacturerData Value:", f"({_dataregex(h5075_layout.struct.size)})"))
+        return h5075_layout.decode(self.getdata(1))
+
+    def monitor_h5075(self, addresses, heartbeat, duration = None):
+        'Yield (address, reading) for H5075 advertisements from the given addresses, skipping repeats of a device\'s last reading until heartbeat seconds have passed.'
+        deadline = None if duration is None else time.monotonic() + duration
+        process = pexpect.Process('bluetoothctl', lambda: None if deadline is None else max(0, deadline - time.monotonic()), '[monitor] ', self.context)
+        try:
+            process.print(*scanduplicates, 'scan on')
+            last = {}
+            while True:
+                try:
+                    process.expect(self.h5075advertisement)
+                except AbortException:
+                    break
+                address = process.grouptext(1)
+                data = process.grouptext(2)
+                process.forget()
+                if address not in addresses:
+                    continue
+                reading = h5075_layout.decode(bytes.fromhex(data))
+                now = time.monotonic()
+                t, previous = last.get(address, (None, None))
+                if reading != previous or now - t >= heartbeat:
+                    last[address] = now, reading
+                    yield address, reading
+        finally:
+            process.dispose()
 
     def dispose(self):
         label = 'dispose'
@@ -136,19 +323,3 @@ class BluetoothShell:
                     break
             finally:
                 p.dispose()
-
-def decode_lywsd03mmc(data):
-    val = partial(int.from_bytes, byteorder = 'little')
-    return dict(
-        temperature = val(data[:2], signed = True) / 100,
-        humidity = val(data[2:3]),
-        voltage = val(data[3:]) / 1000,
-    )
-
-def decode_h5075(data):
-    x, y = divmod(int.from_bytes(data[1:4], 'big'), 1000)
-    return dict(
-        temperature = x / 10,
-        humidity = y / 10,
-        battery = data[4],
-    )
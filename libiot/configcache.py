@@ -0,0 +1,136 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .util import Persistent
+from aridity.config import Config, ConfigCtrl
+from aridity.functions import OpaqueKey
+from aridity.grammar import nullmonitor, templateparser
+from decimal import Decimal
+from pathlib import Path
+import logging, os, sys
+
+log = logging.getLogger(__name__)
+envname = 'LIBIOT_CONFIGCACHE'
+excluded = {'cli'}
+unresolved = {'password'}
+missing = object()
+
+class AppOnlyCtrl(ConfigCtrl):
+
+    def loadsettings(self):
+        pass
+
+def _keys(config):
+    return [k for k, _ in (-config).scope().resolvables.items()]
+
+def _source(config, key):
+    r = (-config).scope().resolvables.getornone(key)
+    return None if r is None else r.unparse()
+
+def _kind(value):
+    if isinstance(value, str):
+        return 'text'
+    if isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+        return 'number'
+    return 'scalar'
+
+def _get(config, key):
+    try:
+        return getattr(config, key)
+    except AttributeError:
+        return missing
+
+def _changes(config, appconfig, path = ()):
+    'Yield (path, kind, value) for every setting of config that appconfig does not resolve to the same value, where kind is a ConfigCtrl.put keyword or source. Lists are yielded whole, and unresolved settings as their source text.'
+    for key in _keys(config):
+        if key in excluded:
+            continue
+        if key in unresolved:
+            source = _source(config, key)
+            if appconfig is missing or source != _source(appconfig, key):
+                yield path + (key,), 'source', source
+            continue
+        value = _get(config, key)
+        if value is missing:
+            continue
+        default = missing if appconfig is missing else _get(appconfig, key)
+        if isinstance(value, Config):
+            if not any(isinstance(k, OpaqueKey) for k in _keys(value)):
+                yield from _changes(value, default if isinstance(default, Config) else missing, path + (key,))
+                continue
+            value = list(value)
+            if isinstance(default, Config):
+                default = list(default)
+        if value != default:
+            yield path + (key,), _kind(value), value
+
+class Snapshot(Persistent):
+
+    def __init__(self, stamp, config, appconfig):
+        self.stamp = stamp
+        self.changes = list(_changes(config, appconfig))
+
+    def validate(self, stamp):
+        return self.stamp == stamp
+
+    def apply(self, config):
+        ctrl = -config
+        for path, kind, value in self.changes:
+            if 'source' == kind:
+                ctrl.put(*path, resolvable = templateparser(nullmonitor)(value))
+            else:
+                ctrl.put(*path, **{kind: value})
+
+def _stamp(paths):
+    stamp = []
+    for p in paths:
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            stamp.append((str(p), None))
+        else:
+            stamp.append((str(p), st.st_mtime_ns, st.st_size))
+    return stamp
+
+def loadappconfig(mainfunction, moduleresource):
+    '''Like ConfigCtrl.loadappconfig, but if opted in via the environment, take what the settings file contributes to the app scope from a snapshot instead of parsing it.
+    The snapshot is discarded when the app config or settings file changes. The cli scope is never cached, and the password only as its expression.'''
+    if not os.environ.get(envname):
+        return ConfigCtrl().loadappconfig(mainfunction, moduleresource)
+    module = mainfunction[0] if isinstance(mainfunction, tuple) else mainfunction.__module__
+    stamp = _stamp([Path(sys.modules[module].__file__).with_name(moduleresource), Path.home() / '.settings.arid'])
+    relpath = Path('config') / Path(moduleresource).stem
+    snapshot = Snapshot.loadcached(relpath, stamp)
+    if snapshot is None:
+        log.debug("Resolve: %s", moduleresource)
+        config = ConfigCtrl().loadappconfig(mainfunction, moduleresource)
+        Snapshot(stamp, config, AppOnlyCtrl().loadappconfig(mainfunction, moduleresource)).persist(relpath)
+    else:
+        config = AppOnlyCtrl().loadappconfig(mainfunction, moduleresource)
+        snapshot.apply(config)
+    return config
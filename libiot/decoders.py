@@ -0,0 +1,106 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from array import array
+from struct import Struct
+
+class Field:
+
+    def __init__(self, name, index, mask = None, quotient = None, modulus = None, divisor = None):
+        self.name = name
+        self.index = index
+        self.mask = mask
+        self.quotient = quotient
+        self.modulus = modulus
+        self.divisor = divisor
+
+    def expression(self):
+        'Python expression computing this field from the unpacked values v0, v1 etc.'
+        e = f"v{self.index}"
+        if self.mask is not None:
+            e = f"({e} & {self.mask})"
+        if self.quotient is not None:
+            e = f"({e} // {self.quotient})"
+        if self.modulus is not None:
+            e = f"({e} % {self.modulus})"
+        if self.divisor is not None:
+            e = f"({e} / {self.divisor})"
+        return e
+
+class Layout:
+
+    def __init__(self, format, *fields):
+        self.struct = Struct(format)
+        self.fields = fields
+        values = ''.join(f"v{i}, " for i in range(len(self.struct.unpack(bytes(self.struct.size)))))
+        columns = ''.join(f"c{i}, " for i in range(len(fields)))
+        names = ', '.join(repr(f.name) for f in fields)
+        source = f'''def decode(buffer, offset = 0):
+    {values}= unpack_from(buffer, offset)
+    return {{{', '.join(f"{f.name!r}: {f.expression()}" for f in fields)}}}
+def decodeall(buffer):
+    {columns}= columns = [array('d') for _ in range({len(fields)})]
+    {''.join(f"a{i}, " for i in range(len(fields)))}= [c.append for c in columns]
+    for {values}in iter_unpack(memoryview(buffer)):
+        {"; ".join(f"a{i}({f.expression()})" for i, f in enumerate(fields))}
+    return dict(zip(({names},), columns))
+'''
+        namespace = dict(array = array, iter_unpack = self.struct.iter_unpack, unpack_from = self.struct.unpack_from)
+        exec(source, namespace)
+        self.decode = namespace['decode']
+        self.decodeall = namespace['decodeall']
+        self.decodeall.__doc__ = 'Decode back-to-back records into one array per field, suitable for numpy.frombuffer if available.'
+
+lywsd03mmc = Layout('<hBH',
+    Field('temperature', 0, divisor = 100),
+    Field('humidity', 1),
+    Field('voltage', 2, divisor = 1000),
+)
+h5075 = Layout('>IBx',
+    Field('temperature', 0, mask = 0xffffff, quotient = 1000, divisor = 10),
+    Field('humidity', 0, mask = 0xffffff, modulus = 1000, divisor = 10),
+    Field('battery', 1),
+)
+lywsd03mmc_history = Layout('<IIhBhB',
+    Field('index', 0),
+    Field('time', 1),
+    Field('max_temperature', 2, divisor = 10),
+    Field('max_humidity', 3),
+    Field('min_temperature', 4, divisor = 10),
+    Field('min_humidity', 5),
+)
+h5075_history = Layout('>I',
+    Field('temperature', 0, mask = 0xffffff, quotient = 1000, divisor = 10),
+    Field('humidity', 0, mask = 0xffffff, modulus = 1000, divisor = 10),
+)
+registry = {
+    ('gatt', 0x21, 0x35): lywsd03mmc,
+    ('gatt', 'ebe0ccbc-7a0a-4b0c-8a1a-6ff2997da3a6'): lywsd03mmc_history,
+    ('gatt', '494e5445-4c4c-4923-5448-434f4d502013'): h5075_history,
+    ('manufacturer', 0xec88): h5075,
+}
@@ -0,0 +1,77 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .sink import flatten
+from .util import Persistent
+from aridity.util import null_exc_info
+from numbers import Number
+from pathlib import Path
+import logging, sys
+
+log = logging.getLogger(__name__)
+cachedir = Path('delta')
+
+def _moved(previous, value, deadband):
+    if isinstance(value, Number) and not isinstance(value, bool) and isinstance(previous, Number) and not isinstance(previous, bool):
+        return abs(value - previous) > deadband
+    return value != previous
+
+class Delta(Persistent):
+
+    @classmethod
+    def loadorcreate(cls, name):
+        return super().loadorcreate(cachedir / name, [name])
+
+    def __init__(self, name):
+        self.name = name
+        self.emitted = {}
+        self.keyframed = None
+
+    def validate(self):
+        return True
+
+    def reduce(self, results, now, deadband, keyframe, field = 'value'):
+        'Keep only the fields that moved beyond the deadband since they were last emitted, or all of them when a keyframe is due.'
+        iskeyframe = self.keyframed is None or now - self.keyframed >= keyframe
+        if iskeyframe:
+            log.info("Keyframe.")
+            self.keyframed = now
+        reduced = {}
+        for device, value in results.items():
+            changes = {}
+            for k, v in flatten(value, '' if isinstance(value, dict) else field):
+                key = device, k
+                if iskeyframe or key not in self.emitted or _moved(self.emitted[key], v, deadband):
+                    changes[k] = self.emitted[key] = v
+            if changes:
+                reduced[device] = changes
+        return reduced
+
+    def dispose(self):
+        if null_exc_info == sys.exc_info():
+            self.persist(cachedir / self.name)
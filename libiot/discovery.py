@@ -0,0 +1,77 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from ipaddress import ip_network
+from random import getrandbits
+import binascii, json, logging, socket, struct, time
+
+log = logging.getLogger(__name__)
+port = 20002
+
+def request(publickey):
+    body = json.dumps(dict(params = dict(rsa_key = publickey))).encode('ascii')
+    packet = bytearray(struct.pack('>BBHHBBII', 2, 0, 1, len(body), 17, 0, getrandbits(32), 0x5a6b7c8d) + body)
+    packet[12:16] = struct.pack('>I', binascii.crc32(packet))
+    return bytes(packet)
+
+def targets(broadcast, subnets):
+    yield broadcast
+    for subnet in subnets:
+        for host in ip_network(subnet, strict = False).hosts():
+            yield str(host)
+
+def discover(publickey, timeout, targets, port = port):
+    'Send one probe to every target from a single socket, then map device ID to address for all replies until timeout.'
+    packet = request(publickey)
+    addresses = {}
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for target in targets:
+            try:
+                s.sendto(packet, (target, port))
+            except OSError as e:
+                log.debug("Probe %s: %s", target, e)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            s.settimeout(remaining)
+            try:
+                data, (ip, _) = s.recvfrom(4096)
+            except socket.timeout:
+                break
+            try:
+                result = json.loads(data[16:])['result']
+                deviceid = result['device_id']
+            except (KeyError, TypeError, ValueError):
+                log.debug("Ignore reply from: %s", ip)
+                continue
+            addresses[deviceid] = result.get('ip', ip)
+    log.info("Discovered: %s", addresses)
+    return addresses
@@ -0,0 +1,84 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from diapyr.util import invokeall
+from itertools import groupby
+from threading import Lock
+import time
+
+class TokenBucket:
+
+    def __init__(self, rate, burst, clock = time.monotonic, sleep = time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.stamp = clock()
+        self.lock = Lock()
+
+    def acquire(self):
+        'Take a token, waiting for it if the bucket is empty. Callers queue in arrival order as tokens may go into debt.'
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate) - 1
+            self.stamp = now
+            delay = -self.tokens / self.rate
+        if delay > 0:
+            self.sleep(delay)
+
+class FanOut:
+
+    def __init__(self, e, bucket = None, stagger = 0, clock = time.monotonic, sleep = time.sleep):
+        self.e = e
+        self.bucket = bucket
+        self.stagger = stagger
+        self.clock = clock
+        self.sleep = sleep
+
+    def _task(self, start, due, f):
+        delay = due - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+        if self.bucket is not None:
+            self.bucket.acquire()
+        value = f()
+        return value, self.clock() - start
+
+    def run(self, tasks):
+        'Run (wave, name, f) tasks a wave at a time in ascending order, returning values and completion latencies by name.'
+        values = {}
+        latencies = {}
+        start = self.clock()
+        for _, wave in groupby(sorted(tasks, key = lambda t: t[0]), key = lambda t: t[0]):
+            wavestart = self.clock()
+            names, futures = zip(*[(name, self.e.submit(self._task, start, wavestart + i * self.stagger, f)) for i, (_, name, f) in enumerate(wave)])
+            for name, (value, latency) in zip(names, invokeall([f.result for f in futures])):
+                values[name] = value
+                latencies[name] = latency
+        return values, latencies
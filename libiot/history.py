@@ -0,0 +1,82 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .trace import tracer
+from .util import Persistent
+from diapyr.util import invokeall
+from pathlib import Path
+from threading import Lock
+import json, sys
+
+cachedir = Path('history')
+
+class Cursors(Persistent):
+
+    @classmethod
+    def loadorcreate(cls, name):
+        return super().loadorcreate(cachedir / name, [name])
+
+    def __init__(self, name):
+        self.name = name
+        self.positions = {}
+
+    def validate(self):
+        return True
+
+    def advance(self, address, position):
+        self.positions[address] = position
+        self.persist(cachedir / self.name)
+
+def rows(columns):
+    'Transpose decoded columns into one dict per record.'
+    names = list(columns)
+    for values in zip(*columns.values()):
+        yield dict(zip(names, values))
+
+def download(name, sensors, readercls, retry, e):
+    'Print the records of the given sensors newer than their cursors as JSON lines, advancing each cursor once its lines are out. Return the number of records per sensor.'
+    cursors = Cursors.loadorcreate(name)
+    lock = Lock()
+    def downloadone(sensor, address):
+        with tracer.scope(sensor):
+            reader = readercls(address, cursors.positions.get(address))
+            try:
+                columns = retry(reader)
+            finally:
+                reader.dispose()
+        if columns is None:
+            return 0
+        lines = [json.dumps(dict(row, sensor = sensor)) for row in rows(columns)]
+        with lock:
+            for line in lines:
+                print(line)
+            sys.stdout.flush()
+            if lines:
+                cursors.advance(address, int(max(columns[readercls.cursor])))
+        return len(lines)
+    return dict(zip(sensors, invokeall([e.submit(downloadone, sensor, address).result for sensor, address in sensors.items()])))
@@ -26,26 +26,58 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+from . import discovery
+from .sampler import AdaptiveSampler
+from .trace import tracer
 from .util import b64str, Cipher, dig, KLAPCipher, P110Exception, Persistent
 from aridity.config import Config
 from aridity.util import null_exc_info
 from base64 import b64decode
-from Crypto.Cipher import PKCS1_v1_5
-from Crypto.PublicKey import RSA
 from datetime import datetime
 from diapyr import types
 from diapyr.util import innerclass
+from functools import partial
 from hashlib import sha1, sha256
 from pathlib import Path
-from requests import Session
-from requests.exceptions import HTTPError
 from secrets import token_bytes
+from threading import Lock
 from uuid import uuid4
-import logging, time, pytz, sys
+import calendar, logging, time, sys
 
 log = logging.getLogger(__name__)
 cachedir = Path('p110')
 charset = 'utf-8'
+keylock = Lock()
+
+class Interval:
+
+    def __init__(self, minutes, perrequest, lookback):
+        self.minutes = minutes
+        self.perrequest = perrequest
+        self.lookback = lookback
+
+    def floor(self, t):
+        return int(t) // (self.minutes * 60) * self.minutes * 60
+
+    def add(self, t, n):
+        return t + n * self.minutes * 60
+
+class MonthlyInterval(Interval):
+
+    def floor(self, t):
+        d = datetime.utcfromtimestamp(t)
+        return calendar.timegm((d.year, d.month, 1, 0, 0, 0))
+
+    def add(self, t, n):
+        d = datetime.utcfromtimestamp(t)
+        y, m = divmod(d.month - 1 + n, 12)
+        return calendar.timegm((d.year + y, m + 1, 1, 0, 0, 0))
+
+intervals = dict(
+    hourly = Interval(60, 24, 24 * 7),
+    daily = Interval(1440, 90, 365),
+    monthly = MonthlyInterval(43200, 12, 36),
+)
 
 class Identity(Persistent):
 
@@ -54,16 +86,31 @@ class Identity(Persistent):
         return super().loadorcreate(cachedir / 'identity', [])
 
     def __init__(self):
-        key = RSA.generate(1024)
-        self.privatekey = key.export_key()
-        self.publickey  = key.publickey().export_key().decode('ascii')
         self.terminaluuid = str(uuid4())
 
     def validate(self):
         return True
 
+    def _keys(self):
+        with keylock:
+            try:
+                return self.privatekey, self.publickey
+            except AttributeError:
+                pass
+            from Crypto.PublicKey import RSA
+            log.debug("Generate key pair.")
+            key = RSA.generate(1024)
+            self.privatekey = key.export_key()
+            self.publickey  = key.publickey().export_key().decode('ascii')
+            self.persist(cachedir / 'identity')
+            return self.privatekey, self.publickey
+
     def decrypt(self, data):
-        return PKCS1_v1_5.new(RSA.importKey(self.privatekey)).decrypt(data, None)
+        from Crypto.Cipher import PKCS1_v1_5
+        from Crypto.PublicKey import RSA
+        privatekey, _ = self._keys()
+        with tracer.phase('rsa'):
+            return PKCS1_v1_5.new(RSA.importKey(privatekey)).decrypt(data, None)
 
     def payload(self, **kwargs):
         return dict(
@@ -72,8 +119,41 @@ class Identity(Persistent):
             terminalUUID = self.terminaluuid,
         )
 
+    def rsakey(self):
+        _, publickey = self._keys()
+        return publickey
+
     def handshakepayload(self):
-        return self.payload(key = self.publickey)
+        return self.payload(key = self.rsakey())
+
+class HostMap(Persistent):
+
+    lock = Lock()
+    quiet = 60
+
+    @classmethod
+    def loadorcreate(cls):
+        return super().loadorcreate(cachedir / 'hosts', [])
+
+    @classmethod
+    def locate(cls, deviceid, staleaddress, identity, config):
+        'Single-flight lookup of the device\'s current address, broadcasting only if no other thread has just done so.'
+        with cls.lock:
+            hostmap = cls.loadorcreate()
+            address = hostmap.addresses.get(deviceid)
+            if address is not None and address != staleaddress or time.time() - hostmap.discovered < cls.quiet:
+                return address
+            hostmap.addresses.update(discovery.discover(identity.rsakey(), float(config.timeout), discovery.targets(config.broadcast, config.subnets), int(config.port)))
+            hostmap.discovered = time.time()
+            hostmap.persist(cachedir / 'hosts')
+            return hostmap.addresses.get(deviceid)
+
+    def __init__(self):
+        self.addresses = {}
+        self.discovered = 0
+
+    def validate(self):
+        return True
 
 class LoginParams:
 
@@ -93,6 +173,13 @@ class LoginParams:
             with self.password:
                 pass
 
+class KLAPSession:
+    'HTTP session and the cipher negotiated on it, replaced together so that no request pairs one with the other\'s successor.'
+
+    def __init__(self, session, cipher):
+        self.session = session
+        self.cipher = cipher
+
 class P110(Persistent):
 
     @classmethod
@@ -109,9 +196,19 @@ class P110(Persistent):
         self.host = config.host
         self._reset()
         self.identity = identity
+        self.lock = Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
 
     def _reset(self):
-        for name in 'klapcipher', 'klapsession', 'reqparams', 'cipher', 'session':
+        for name in 'klap', 'reqparams', 'cipher', 'session':
             try:
                 delattr(self, name)
             except AttributeError:
@@ -120,6 +217,19 @@ class P110(Persistent):
     def validate(self, contextidentity):
         return self.identity.terminaluuid == contextidentity.terminaluuid
 
+    def address(self):
+        return getattr(self, 'relocated', self.host)
+
+    def knowndeviceid(self):
+        return getattr(self, 'deviceid', None)
+
+    def cursors(self):
+        try:
+            return self.energycursors
+        except AttributeError:
+            self.energycursors = cursors = {}
+            return cursors
+
     def dispose(self):
         if null_exc_info == sys.exc_info():
             self.persist(cachedir / self.host)
@@ -129,8 +239,38 @@ class P110(Persistent):
 
         def __init__(self, config, loginparams):
             self.timeout = config.timeout
+            self.sampler = config.sampler
+            self.discovery = config.discovery
             self.loginparams = loginparams
 
+        def _send(self, session, path, **kwargs):
+            from requests.exceptions import ConnectionError
+            while True:
+                try:
+                    with tracer.phase('post'):
+                        return session.post(f"http://{self.address()}/{path}", timeout = self.timeout, **kwargs)
+                except ConnectionError:
+                    if not self._relocate():
+                        raise
+
+        def _relocate(self):
+            deviceid = self.knowndeviceid()
+            if deviceid is None:
+                return False
+            address = HostMap.locate(deviceid, self.address(), self.identity, self.discovery)
+            if address is None or address == self.address():
+                return False
+            log.info("[%s] Relocated to: %s", self.host, address)
+            self._enclosinginstance.relocated = address
+            return True
+
+        def _learn(self, methodname, result):
+            if 'get_device_info' == methodname:
+                self._enclosinginstance.deviceid = result['device_id']
+            elif 'login_device' != methodname and self.knowndeviceid() is None:
+                self.get_device_info()
+            return result
+
         def ison(self):
             return self.get_device_info()['device_on']
 
@@ -147,12 +287,48 @@ class P110(Persistent):
             return 'on' if self.ison() else 'off'
 
         def time(self):
+            import pytz
             d = self.get_device_time()
             return pytz.utc.localize(datetime.utcfromtimestamp(d['timestamp'])).astimezone(pytz.timezone(d['region'])).strftime('%Y-%m-%d %H:%M:%S %Z')
 
         def power(self):
             return self.get_energy_usage()['current_power'] / 1000
 
+        def monitor(self):
+            c = self.sampler
+            return AdaptiveSampler(float(c.fast), float(c.slow), float(c.threshold)).run(self.power, float(c.duration))
+
+        def _energydata(self, interval, windows):
+            requests = [dict(method = 'get_energy_data', params = dict(start_timestamp = start, end_timestamp = end, interval = interval.minutes)) for start, end in windows]
+            if 1 == len(requests):
+                return [self.get_energy_data(**requests[0]['params'])]
+            return [P110Exception.check(r) for r in self.multipleRequest(requests = requests)['responses']]
+
+        def history(self, intervalname, retry = lambda f: f(), batchsize = 8):
+            'Yield complete buckets newer than the persisted cursor as (timestamp, value) pairs, several windows per round trip.'
+            interval = intervals[intervalname]
+            cursors = self.cursors()
+            end = interval.floor(time.time())
+            start = cursors.get(intervalname, interval.add(end, -interval.lookback))
+            windows = []
+            while start < end:
+                stop = min(end, interval.add(start, interval.perrequest))
+                windows.append((start, stop))
+                start = stop
+            for i in range(0, len(windows), batchsize):
+                batch = windows[i:i + batchsize]
+                results = retry(partial(self._energydata, interval, batch))
+                if results is None:
+                    break
+                for (start, stop), result in zip(batch, results):
+                    t = start
+                    for value in result['data']:
+                        if t >= stop:
+                            break
+                        yield t, value
+                        t = interval.add(t, 1)
+                    cursors[intervalname] = stop
+
     class Client(BaseClient):
 
         def _post(self, **kwargs):
@@ -163,14 +339,16 @@ class P110(Persistent):
             try:
                 session = self.session
             except AttributeError:
+                from requests import Session
                 self._enclosinginstance.session = session = Session()
-            return session.post(f"http://{self.host}/app", **d, json = kwargs, timeout = self.timeout)
+            return self._send(session, 'app', **d, json = kwargs)
 
         def _handshake(self):
-            self._enclosinginstance.cipher = Cipher.create(self.identity.decrypt(b64decode(P110Exception.check(self._post(
-                method = 'handshake',
-                params = self.identity.handshakepayload(),
-            ).json())['key'])))
+            with tracer.phase('handshake'):
+                self._enclosinginstance.cipher = Cipher.create(self.identity.decrypt(b64decode(P110Exception.check(self._post(
+                    method = 'handshake',
+                    params = self.identity.handshakepayload(),
+                ).json())['key'])))
 
         def __getattr__(self, methodname):
             if methodname.startswith('__') or methodname in {'session', 'cipher', 'reqparams'}:
@@ -182,13 +360,14 @@ class P110(Persistent):
                     if not hasattr(self, 'reqparams') and 'login_device' != methodname:
                         self._login()
                     try:
-                        return P110Exception.check(self.cipher.decrypt(P110Exception.check(self._post(
-                            method = 'securePassthrough',
-                            params = dict(request = self.cipher.encrypt(self.identity.payload(
-                                method = methodname,
-                                params = methodparams,
-                            ))),
-                        ).json())['response']))
+                        with tracer.phase(methodname):
+                            return self._learn(methodname, P110Exception.check(self.cipher.decrypt(P110Exception.check(self._post(
+                                method = 'securePassthrough',
+                                params = dict(request = self.cipher.encrypt(self.identity.payload(
+                                    method = methodname,
+                                    params = methodparams,
+                                ))),
+                            ).json())['response'])))
                     except P110Exception as e:
                         if 9999 != e.error_code:
                             raise
@@ -196,43 +375,52 @@ class P110(Persistent):
             return method
 
         def _login(self):
-            self._enclosinginstance.reqparams = dict(token = self.login_device(**self.loginparams.params)['token'])
+            with tracer.phase('login'):
+                self._enclosinginstance.reqparams = dict(token = self.login_device(**self.loginparams.params)['token'])
 
     class KLAP(BaseClient):
 
-        def _post(self, slug, params, data):
-            try:
-                session = self.klapsession
-            except AttributeError:
-                self._enclosinginstance.klapsession = session = Session()
-            response = session.post(f"http://{self.host}/app/{slug}", params = params, data = data, timeout = self.timeout)
+        def _post(self, session, slug, params, data):
+            response = self._send(session, f"app/{slug}", params = params, data = data)
             response.raise_for_status()
             return response.content
 
         def _handshake(self):
-            localtoken = token_bytes(16)
-            remotetoken = self._post('handshake1', {}, localtoken)[:16]
-            self._post('handshake2', {}, dig(sha256, remotetoken + localtoken + self.loginparams.hash))
-            return KLAPCipher(localtoken + remotetoken + self.loginparams.hash)
+            from requests import Session
+            with tracer.phase('handshake'):
+                session = Session()
+                localtoken = token_bytes(16)
+                remotetoken = self._post(session, 'handshake1', {}, localtoken)[:16]
+                self._post(session, 'handshake2', {}, dig(sha256, remotetoken + localtoken + self.loginparams.hash))
+                return KLAPSession(session, KLAPCipher(localtoken + remotetoken + self.loginparams.hash))
+
+        def _session(self, stale):
+            'Return the current session, replacing it if it is the given stale one. Threads that find the same session stale handshake only once.'
+            with self.lock:
+                klap = getattr(self, 'klap', None)
+                if klap is None or klap is stale:
+                    self._enclosinginstance.klap = klap = self._handshake()
+                return klap
 
         def __getattr__(self, methodname):
-            if methodname in {'klapsession', 'klapcipher'}:
+            if methodname.startswith('__') or 'klap' == methodname:
                 raise AttributeError(methodname)
             def method(**methodparams):
+                from requests.exceptions import HTTPError
+                stale = None
                 while True:
+                    klap = self._session(stale)
+                    channel = klap.cipher.channel()
                     try:
-                        cipher = self.klapcipher
-                    except AttributeError:
-                        self._enclosinginstance.klapcipher = cipher = self._handshake()
-                    channel = cipher.channel()
-                    try:
-                        return P110Exception.check(channel.decrypt(self._post(
-                            'request',
-                            dict(seq = channel.seq),
-                            channel.encrypt(dict(method = methodname, params = methodparams)),
-                        )))
+                        with tracer.phase(methodname):
+                            return self._learn(methodname, P110Exception.check(channel.decrypt(self._post(
+                                klap.session,
+                                'request',
+                                dict(seq = channel.seq),
+                                channel.encrypt(dict(method = methodname, params = methodparams)),
+                            ))))
                     except HTTPError as e:
                         if 403 != e.response.status_code:
                             raise
-                        self._reset()
+                        stale = klap
             return method
@@ -26,9 +26,9 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+from .trace import tracer
 from .util import AbortException
 from io import BytesIO
-from pexpect import EOF, spawn, TIMEOUT
 from signal import SIGTERM
 from types import SimpleNamespace
 import logging, re
@@ -38,6 +38,7 @@ log = logging.getLogger(__name__)
 class Process:
 
     def __init__(self, command, remaining, logprefix, context):
+        from pexpect import spawn
         self.buffer = BytesIO()
         self.ctl = spawn(command, logfile = self.buffer)
         self.remaining = remaining
@@ -49,11 +50,27 @@ class Process:
             self.ctl.sendline(l)
 
     def expect(self, *alternatives, cleanup = False):
-        try:
-            return alternatives[self.ctl.expect([a.regex for a in alternatives], timeout = None if cleanup else self.remaining())]
-        except TIMEOUT:
-            log.debug("%sSession tail: %s", self.logprefix, self._tail())
-            raise AbortException('Out of time.')
+        from pexpect import TIMEOUT
+        with tracer.phase('expect'):
+            try:
+                return alternatives[self.ctl.expect([a.regex for a in alternatives], timeout = None if cleanup else self.remaining())]
+            except TIMEOUT:
+                log.debug("%sSession tail: %s", self.logprefix, self._tail())
+                raise AbortException('Out of time.')
+
+    def poll(self, alternative, timeout):
+        'Like expect with a single alternative, but return None if it does not match within the timeout.'
+        from pexpect import TIMEOUT
+        remaining = self.remaining()
+        outoftime = remaining is not None and remaining <= timeout
+        with tracer.phase('expect'):
+            try:
+                self.ctl.expect(alternative.regex, timeout = remaining if outoftime else timeout)
+            except TIMEOUT:
+                if outoftime:
+                    raise AbortException('Out of time.')
+                return
+        return alternative
 
     def _tail(self):
         text = self.buffer.getvalue().decode()
@@ -74,10 +91,16 @@ class Process:
             n += 1
         return ''.join(lines[i:])
 
+    def forget(self):
+        'Discard the session log so far, so that long-running sessions do not grow without bound.'
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
     def grouptext(self, group):
         return self.ctl.match.group(group).decode()
 
     def dispose(self):
+        from pexpect import EOF
         self.ctl.kill(SIGTERM)
         self.expect(SimpleNamespace(regex = EOF), cleanup = True)
         self.ctl.wait()
@@ -0,0 +1,108 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from threading import Lock
+import logging, sys, threading
+
+log = logging.getLogger(__name__)
+
+class Profiler:
+
+    frames = 25
+
+    def __init__(self):
+        self.lock = Lock()
+        self.profiles = []
+
+    def _profile(self):
+        from cProfile import Profile
+        profile = Profile()
+        with self.lock:
+            self.profiles.append((threading.current_thread().name, profile))
+        profile.enable()
+
+    def _bootstrap(self, frame, event, arg):
+        sys.setprofile(None)
+        self._profile()
+
+    def start(self):
+        import tracemalloc
+        tracemalloc.start(self.frames)
+        self.baseline = tracemalloc.take_snapshot()
+        self._profile()
+        if sys.version_info < (3, 12): # Later versions profile all threads from the one profiler.
+            threading.setprofile(self._bootstrap)
+
+    def stop(self):
+        import tracemalloc
+        threading.setprofile(None)
+        with self.lock:
+            profiles = list(self.profiles)
+        profiles[0][1].disable()
+        self.snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')])
+        tracemalloc.stop()
+        return profiles
+
+    def dump(self, path, profiles):
+        'Write one pstats file per thread and merged, plus the tracemalloc snapshot.'
+        from pstats import Stats
+        path = Path(path)
+        path.parent.mkdir(parents = True, exist_ok = True)
+        for i, (name, profile) in enumerate(profiles):
+            profile.create_stats()
+            profile.dump_stats(f"{path}.{i}.{name}.prof")
+        stats = Stats(*(profile for _, profile in profiles))
+        stats.dump_stats(f"{path}.prof")
+        self.snapshot.dump(f"{path}.tracemalloc")
+        return stats
+
+    def summary(self, stats, top, stream = None):
+        'Print the hottest functions by cumulative time and the sites whose allocations grew the most during the run.'
+        if stream is None:
+            stream = sys.stderr
+        stats.stream = stream
+        stats.sort_stats('cumulative').print_stats(top)
+        print(f"Top {top} allocation sites:", file = stream)
+        for stat in self.snapshot.compare_to(self.baseline, 'lineno')[:top]:
+            print(stat, file = stream)
+
+def profiling(path, top = 20):
+    return nullcontext() if path is None else _profiling(path, top)
+
+@contextmanager
+def _profiling(path, top):
+    profiler = Profiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiles = profiler.stop()
+        log.info("Profiled threads: %s", len(profiles))
+        profiler.summary(profiler.dump(path, profiles), top)
@@ -0,0 +1,135 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .mijia import carnotcycle
+from .util import Persistent
+from aridity.util import null_exc_info
+from collections import deque
+from operator import itemgetter
+from pathlib import Path
+import math, sys
+
+cachedir = Path('rolling')
+
+def _absolutehumidity(reading):
+    return carnotcycle(reading['temperature'], reading['humidity'])
+
+metrics = dict(
+    temperature = itemgetter('temperature'),
+    humidity = itemgetter('humidity'),
+    absolute_humidity = _absolutehumidity,
+)
+
+class Window:
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()
+        self.lows = deque()
+        self.highs = deque()
+
+    def add(self, t, value):
+        if not self.samples:
+            self.shift = value
+            self.total = self.squares = 0
+        x = value - self.shift
+        self.samples.append((t, x))
+        self.total += x
+        self.squares += x * x
+        while self.lows and self.lows[-1][1] >= value:
+            self.lows.pop()
+        self.lows.append((t, value))
+        while self.highs and self.highs[-1][1] <= value:
+            self.highs.pop()
+        self.highs.append((t, value))
+        self._expire(t - self.seconds)
+
+    def _expire(self, cutoff):
+        samples = self.samples
+        while samples[0][0] <= cutoff:
+            _, x = samples.popleft()
+            self.total -= x
+            self.squares -= x * x
+        if 1 == len(samples):
+            _, x = samples[0]
+            self.total = x
+            self.squares = x * x
+        for q in self.lows, self.highs:
+            while q[0][0] <= cutoff:
+                q.popleft()
+
+    def stats(self):
+        n = len(self.samples)
+        mean = self.total / n
+        return dict(
+            count = n,
+            min = self.lows[0][1],
+            max = self.highs[0][1],
+            mean = self.shift + mean,
+            stddev = math.sqrt(max(0, self.squares / n - mean * mean)),
+        )
+
+class Rolling(Persistent):
+
+    @classmethod
+    def loadorcreate(cls, name, seconds):
+        return super().loadorcreate(cachedir / name, [name, seconds], seconds)
+
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.windows = {}
+
+    def validate(self, seconds):
+        return self.seconds == seconds
+
+    def update(self, device, reading, now):
+        stats = {}
+        for metric, f in metrics.items():
+            try:
+                value = f(reading)
+            except KeyError:
+                continue
+            key = device, metric
+            try:
+                window = self.windows[key]
+            except KeyError:
+                self.windows[key] = window = Window(self.seconds)
+            window.add(now, value)
+            stats[metric] = window.stats()
+        return stats
+
+    def apply(self, results, now):
+        for device, reading in results.items():
+            if reading is not None:
+                reading['rolling'] = self.update(device, reading, now)
+        return results
+
+    def dispose(self):
+        if null_exc_info == sys.exc_info():
+            self.persist(cachedir / self.name)
@@ -0,0 +1,99 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .rolling import metrics
+from .trace import tracer
+from threading import Lock
+import logging, time
+
+log = logging.getLogger(__name__)
+
+class Patience:
+    'Stand-in for Retry in long-running sessions, allowing every wait the same number of seconds.'
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def remaining(self):
+        return self.seconds
+
+class Rule:
+
+    def __init__(self, name, sensor, metric, plug, on, off):
+        self.name = name
+        self.sensor = sensor
+        self.metric = metric
+        self.plug = plug
+        self.on = on
+        self.off = off
+        self.state = None
+        self.latencies = []
+
+    def decide(self, value):
+        'Return the state the plug should be in, or None within the hysteresis band. If on exceeds off the plug runs while the value is high, otherwise while it is low.'
+        if self.on > self.off:
+            return True if value >= self.on else False if value <= self.off else None
+        return True if value <= self.on else False if value >= self.off else None
+
+class Engine:
+
+    def __init__(self, rules, switches, clock = time.monotonic):
+        self.rules = rules
+        self.switches = switches
+        self.clock = clock
+        self.lock = Lock()
+
+    def feed(self, sensor, reading, t0):
+        'Evaluate the rules of the given sensor, switching plugs whose state should change. The latency is measured from t0, when the reading arrived.'
+        for rule in self.rules:
+            if sensor != rule.sensor:
+                continue
+            metric = metrics[rule.metric]
+            try:
+                value = metric(reading)
+            except KeyError:
+                continue
+            desired = rule.decide(value)
+            with self.lock:
+                if desired is None or desired == rule.state:
+                    continue
+                rule.state = desired
+            try:
+                with tracer.phase('switch', rule.plug):
+                    self.switches[rule.plug](desired)
+            except Exception:
+                log.exception("[%s] Failed to switch: %s", rule.name, rule.plug)
+                with self.lock:
+                    rule.state = None
+                continue
+            latency = self.clock() - t0
+            rule.latencies.append(latency)
+            log.info("[%s] Switch %s %s at %s %.3f, latency %.3fs", rule.name, rule.plug, 'on' if desired else 'off', rule.metric, value, latency)
+
+    def report(self):
+        return {rule.name: dict(switches = len(rule.latencies), mean = sum(rule.latencies) / len(rule.latencies), max = max(rule.latencies)) if rule.latencies else dict(switches = 0) for rule in self.rules}
@@ -0,0 +1,80 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import time
+
+class AdaptiveSampler:
+
+    backoff = 2
+
+    def __init__(self, fast, slow, threshold, clock = time.monotonic, sleep = time.sleep):
+        self.fast = fast
+        self.slow = slow
+        self.threshold = threshold
+        self.clock = clock
+        self.sleep = sleep
+
+    def samples(self, read, duration):
+        'Poll at the fast period while the value moves by more than threshold, backing off towards the slow period while it holds.'
+        start = self.clock()
+        period = self.fast
+        previous = None
+        while True:
+            t = self.clock()
+            value = read()
+            yield t - start, value
+            if previous is None or abs(value - previous) > self.threshold:
+                period = self.fast
+            else:
+                period = min(self.slow, period * self.backoff)
+            previous = value
+            due = t + period
+            if due - start > duration:
+                break
+            self.sleep(max(0, due - self.clock()))
+
+    def run(self, read, duration):
+        'Integrate watts to watt-hours by trapezium, with a bound on the error from changes between samples.'
+        samples = self.samples(read, duration)
+        t0, v0 = next(samples)
+        requests = 1
+        energy = error = 0
+        for t, value in samples:
+            dt = (t - t0) / 3600
+            energy += (value + v0) / 2 * dt
+            error += abs(value - v0) / 2 * dt
+            requests += 1
+            t0, v0 = t, value
+        return dict(
+            seconds = t0,
+            requests = requests,
+            fixed_requests = int(t0 / self.fast) + 1,
+            energy = energy,
+            error = error,
+            mean = energy * 3600 / t0 if t0 else v0,
+        )
@@ -26,7 +26,27 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import logging
+from .. import sink
+from contextlib import nullcontext
+import logging, time
 
 def initlogging():
     logging.basicConfig(format = "%(asctime)s %(levelname)s %(message)s", level = logging.DEBUG)
+
+def opensink(config):
+    return nullcontext() if config.export is None else sink.create(config.export, config.format, int(config.flush.size), float(config.flush.interval))
+
+def changes(config, name, results, field = 'value'):
+    if not config.changes:
+        return results
+    from ..delta import Delta
+    delta = Delta.loadorcreate(name)
+    try:
+        return delta.reduce(results, time.time(), float(config.delta.deadband), float(config.delta.keyframe), field)
+    finally:
+        delta.dispose()
+
+def export(config, measurement, results, field = 'value'):
+    with opensink(config) as s:
+        if s is not None:
+            s.addall(measurement, results, field)
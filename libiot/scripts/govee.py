@@ -27,16 +27,21 @@
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 'Get data from Govee H5075.'
-from . import initlogging
+from . import changes, export, initlogging, opensink
+from .. import configcache, sink
 from ..bluetoothctl import BluetoothShell
+from ..history import download
+from ..profiling import profiling
+from ..rolling import Rolling
+from ..trace import tracer
 from ..util import Retry
 from argparse import ArgumentParser
-from aridity.config import Config, ConfigCtrl
+from aridity.config import Config
 from concurrent.futures import ThreadPoolExecutor
 from diapyr import DI, types
 from diapyr.util import invokeall
 from functools import partial
-import json, logging
+import json, logging, time
 
 class Script:
 
@@ -47,27 +52,74 @@ class Script:
         self.shell = shell
         self.retry = retry
         self.e = e
+        self.window = config.window
+        self.heartbeat = float(config.heartbeat)
+
+    def _read(self, name, address):
+        with tracer.scope(name):
+            return self.retry(partial(self.shell.read_h5075, address))
+
+    def history(self):
+        return download('govee', {name: address for name, address in self.sensors.items() if name not in self.exclude}, self.shell.H5075History, self.retry, self.e)
 
     def run(self):
-        return dict(zip(self.sensors, invokeall([self.e.submit(self.retry, (lambda: None) if name in self.exclude else partial(self.shell.read_h5075, address)).result for name, address in self.sensors.items()])))
+        results = dict(zip(self.sensors, invokeall([(lambda: None) if name in self.exclude else self.e.submit(self._read, name, address).result for name, address in self.sensors.items()])))
+        if self.window is not None:
+            rolling = Rolling.loadorcreate('govee', float(self.window))
+            rolling.apply(results, time.time())
+            rolling.dispose()
+        return results
+
+    def monitor(self, s):
+        names = {address: name for name, address in self.sensors.items() if name not in self.exclude}
+        for address, reading in self.shell.monitor_h5075(names, self.heartbeat):
+            result = {names[address]: reading}
+            print(json.dumps(result), flush = True)
+            if s is not None:
+                s.addall('govee', result)
 
 def main():
     initlogging()
-    config = ConfigCtrl().loadappconfig(main, 'govee.arid')
+    config = configcache.loadappconfig(main, 'govee.arid')
     parser = ArgumentParser()
+    parser.add_argument('--changes', action = 'store_true')
     parser.add_argument('--exclude', action = 'append', default = [])
+    parser.add_argument('--export')
     parser.add_argument('--fail', action = 'store_true')
+    parser.add_argument('--format', choices = sorted(sink.formats))
+    parser.add_argument('--heartbeat')
+    parser.add_argument('--history', action = 'store_true')
+    parser.add_argument('--monitor', action = 'store_true')
+    parser.add_argument('--profile')
     parser.add_argument('--retry')
+    parser.add_argument('--trace')
     parser.add_argument('-v', action = 'store_true')
+    parser.add_argument('--window')
     parser.parse_args(namespace = config.cli)
     logging.getLogger().setLevel(logging.DEBUG if config.verbose else logging.INFO)
-    with DI() as di, ThreadPoolExecutor() as e:
+    tracer.enabled = config.trace is not None
+    with profiling(config.profile), DI() as di, ThreadPoolExecutor() as e:
         di.add(BluetoothShell)
         di.add(config)
         di.add(e)
         di.add(Retry)
         di.add(Script)
-        print(json.dumps(di(Script).run()))
+        if config.history:
+            logging.info("Records: %s", di(Script).history())
+        elif config.monitor:
+            with opensink(config) as s:
+                try:
+                    di(Script).monitor(s)
+                except KeyboardInterrupt:
+                    pass
+        else:
+            results = di(Script).run()
+    if not (config.history or config.monitor):
+        results = changes(config, 'govee', results)
+        print(json.dumps(results))
+        export(config, 'govee', results)
+    if tracer.enabled:
+        tracer.dump(config.trace)
 
 if '__main__' == __name__:
     main()
@@ -0,0 +1,69 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+'Run several of the other commands in one interpreter, separated by + e.g. libiot mijia + govee + p110 status.'
+from importlib import import_module
+import logging, sys
+
+log = logging.getLogger(__name__)
+commands = 'govee', 'mijia', 'p110', 'p110history', 'temper'
+separator = '+'
+
+def _invocations(args):
+    invocation = []
+    for arg in args:
+        if separator == arg:
+            yield invocation
+            invocation = []
+        else:
+            invocation.append(arg)
+    yield invocation
+
+def main():
+    invocations = list(_invocations(sys.argv[1:]))
+    for invocation in invocations:
+        if not invocation or invocation[0] not in commands:
+            sys.exit(f"Expected one of {', '.join(commands)} at: {' '.join(invocation)}")
+    status = 0
+    argv = sys.argv
+    for name, *args in invocations:
+        sys.argv = [name, *args]
+        try:
+            import_module(f".{name}", __package__).main()
+        except SystemExit as e:
+            if e.code:
+                status = 1
+        except Exception:
+            log.exception("Failed: %s", name)
+            status = 1
+        finally:
+            sys.argv = argv
+    sys.exit(status)
+
+if '__main__' == __name__:
+    main()
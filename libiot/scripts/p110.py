@@ -27,61 +27,90 @@
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 'Run given command on all configured Tapo P100/P110 plugs.'
-from . import initlogging
+from . import changes, export, initlogging
+from .. import configcache, sink
+from ..fanout import FanOut, TokenBucket
 from ..p110 import Identity, LoginParams, P110
+from ..profiling import profiling
+from ..trace import tracer
 from ..util import Retry
 from argparse import ArgumentParser
-from aridity.config import Config, ConfigCtrl
+from aridity.config import Config
 from concurrent.futures import ThreadPoolExecutor
-from contextlib import ExitStack
 from diapyr import DI, types
-from diapyr.util import invokeall
+from functools import partial
 import json, logging
 
+log = logging.getLogger(__name__)
+
 @types(this = Identity)
 def identityfactory():
     return Identity.loadorcreate()
 
-@types(Config, Identity, LoginParams, this = P110)
-def p110factory(config, identity, loginparams):
-    return getattr(P110.loadorcreate(config, identity), config.protocol)(config, loginparams)
-
-class Command:
+class Script:
 
-    @types(Config, Retry, P110, str)
-    def __init__(self, config, retry, p110, name):
-        self.command = getattr(p110, config.command)
+    @types(Config, Identity, LoginParams, Retry, ThreadPoolExecutor)
+    def __init__(self, config, identity, loginparams, retry, e):
+        self.plugs = list(-config.plug)
+        self.identity = identity
+        self.loginparams = loginparams
         self.retry = retry
-        self.name = name
+        rate = float(config.fanout.rate)
+        self.fanout = FanOut(e, TokenBucket(rate, int(config.fanout.burst)) if rate else None, float(config.fanout.stagger))
+
+    def _command(self, name, conf):
+        p110 = P110.loadorcreate(conf, self.identity)
+        try:
+            command = getattr(getattr(p110, conf.protocol)(conf, self.loginparams), conf.command)
+            with tracer.scope(name):
+                return self.retry(command)
+        finally:
+            p110.dispose()
 
-    def __call__(self):
-        return self.name, self.retry(self.command)
+    def run(self):
+        results, latencies = self.fanout.run([(int(conf.wave), name, partial(self._command, name, conf)) for name, conf in self.plugs])
+        log.info("Latency: %s", json.dumps({name: round(latency, 3) for name, latency in latencies.items()}))
+        return results
+
+def run(config):
+    workers = config.workers
+    with DI() as di, ThreadPoolExecutor(None if workers is None else int(workers)) as e:
+        di.add(config)
+        di.add(e)
+        di.add(identityfactory)
+        di.add(Retry)
+        di.add(LoginParams)
+        di.add(Script)
+        return di(Script).run()
 
 def main():
     initlogging()
-    config = ConfigCtrl().loadappconfig(main, 'p110.arid')
+    config = configcache.loadappconfig(main, 'p110.arid')
     parser = ArgumentParser()
+    parser.add_argument('--changes', action = 'store_true')
     parser.add_argument('--cron', action = 'store_true')
+    parser.add_argument('--export')
     parser.add_argument('-f', action = 'store_true')
     parser.add_argument('--fail', action = 'store_true')
+    parser.add_argument('--format', choices = sorted(sink.formats))
+    parser.add_argument('--profile')
+    parser.add_argument('--rate')
     parser.add_argument('--retry')
+    parser.add_argument('--stagger')
+    parser.add_argument('--trace')
     parser.add_argument('-v', action = 'store_true')
+    parser.add_argument('--workers')
     parser.add_argument('command')
     parser.parse_args(namespace = config.cli)
     logging.getLogger().setLevel(logging.DEBUG if config.verbose else logging.INFO)
-    with DI() as di, ExitStack() as stack, ThreadPoolExecutor() as e:
-        di.add(config)
-        di.add(identityfactory)
-        di.add(Retry)
-        di.add(LoginParams)
-        def entryfuture(name, conf):
-            plugdi = stack.enter_context(DI(di))
-            plugdi.add(name)
-            plugdi.add(conf)
-            plugdi.add(p110factory)
-            plugdi.add(Command)
-            return e.submit(plugdi(Command))
-        print(json.dumps(dict(invokeall([entryfuture(*item).result for item in -config.plug]))))
+    tracer.enabled = config.trace is not None
+    with profiling(config.profile):
+        results = run(config)
+    results = changes(config, 'p110', results, config.command)
+    print(json.dumps(results))
+    export(config, 'p110', results, config.command)
+    if tracer.enabled:
+        tracer.dump(config.trace)
 
 if '__main__' == __name__:
     main()
@@ -0,0 +1,138 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+'Measure how the p110 fan-out scales against a simulated fleet of plugs.'
+from . import initlogging
+from .p110 import run
+from ..p110 import Identity
+from ..simulator import serve
+from ..util import Persistent
+from argparse import ArgumentParser
+from aridity.config import ConfigCtrl
+from aridity.keyring import Password
+from multiprocessing import Pipe, Process
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+import json, logging, resource, threading, time
+
+username = 'user@example.com'
+password = 'secret'
+
+def _config(plugs, args):
+    config = ConfigCtrl().loadappconfig((run.__module__, 'p110bench'), 'p110.arid', settingsoptional = True)
+    ctrl = -config
+    for name, (host, protocol) in plugs.items():
+        ctrl.printf("plug %s host = %s", name, host)
+        ctrl.printf("plug %s protocol = %s", name, protocol)
+    ctrl.printf("username = %s", username)
+    ctrl.put('password', scalar = Password(password, None))
+    ctrl.printf("timeout = %s", args.timeout)
+    config.cli.command = args.command
+    config.cli.cron = config.cli.f = config.cli.fail = False
+    config.cli.rate = str(args.rate)
+    config.cli.retry = str(args.retry)
+    config.cli.stagger = str(args.stagger)
+    config.cli.workers = args.workers
+    return config
+
+class PeakThreads:
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self.running = True
+        self.thread = Thread(target = self._sample)
+        self.thread.start()
+
+    def _sample(self):
+        while self.running:
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(.005)
+
+    def dispose(self):
+        self.running = False
+        self.thread.join()
+        return self.peak - 1
+
+def _measure(size, phase, config):
+    threads = PeakThreads()
+    t = time.perf_counter()
+    try:
+        results = run(config)
+    finally:
+        peak = threads.dispose()
+    seconds = time.perf_counter() - t
+    return dict(
+        plugs = size,
+        phase = phase,
+        seconds = seconds,
+        perplug_ms = seconds / size * 1000,
+        peak_threads = peak,
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        failed = sum(1 for v in results.values() if v is None),
+    )
+
+def main():
+    initlogging()
+    parser = ArgumentParser()
+    parser.add_argument('--command', default = 'status')
+    parser.add_argument('--failrate', type = float, default = 0)
+    parser.add_argument('--klap', type = float, default = .5)
+    parser.add_argument('--latency', type = float, default = .01)
+    parser.add_argument('--rate', type = float, default = 0)
+    parser.add_argument('--retry', type = float, default = 0)
+    parser.add_argument('--stagger', type = float, default = 0)
+    parser.add_argument('--timeout', type = float, default = 5)
+    parser.add_argument('-v', action = 'store_true')
+    parser.add_argument('--workers', type = int)
+    parser.add_argument('sizes', nargs = '*', type = int, default = [10, 100, 500, 1000, 2000])
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO if args.v else logging.WARNING)
+    rows = []
+    for size in sorted(args.sizes):
+        conn, childconn = Pipe()
+        simulator = Process(target = serve, args = (childconn, size, args.klap, args.latency, args.failrate, username, password))
+        simulator.start()
+        try:
+            config = _config(conn.recv(), args)
+            with TemporaryDirectory() as tempdir:
+                Persistent.cacheroot = Path(tempdir)
+                Identity.loadorcreate().handshakepayload()
+                for phase in 'cold', 'warm':
+                    row = _measure(size, phase, config)
+                    print(json.dumps(row), flush = True)
+                    rows.append(row)
+        finally:
+            conn.send(None)
+            simulator.join()
+    for phase in 'cold', 'warm':
+        perplug = [r['perplug_ms'] for r in rows if phase == r['phase']]
+        print(json.dumps(dict(phase = phase, linearity = max(perplug) / min(perplug))))
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,100 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+'Stream energy history of all configured Tapo P110 plugs as JSON lines, fetching only buckets newer than the previous run.'
+from . import initlogging
+from .p110 import identityfactory
+from .. import configcache
+from ..p110 import Identity, intervals, LoginParams, P110
+from ..trace import tracer
+from ..util import Retry
+from argparse import ArgumentParser
+from aridity.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from diapyr import DI, types
+from diapyr.util import invokeall
+from threading import Lock
+import json, logging, sys
+
+class Script:
+
+    @types(Config, Identity, LoginParams, Retry, ThreadPoolExecutor)
+    def __init__(self, config, identity, loginparams, retry, e):
+        self.plugs = list(-config.plug)
+        self.interval = config.interval
+        self.identity = identity
+        self.loginparams = loginparams
+        self.retry = retry
+        self.e = e
+        self.lock = Lock()
+
+    def _history(self, name, conf):
+        p110 = P110.loadorcreate(conf, self.identity)
+        try:
+            client = getattr(p110, conf.protocol)(conf, self.loginparams)
+            n = 0
+            with tracer.scope(name):
+                for timestamp, value in client.history(self.interval, self.retry):
+                    line = json.dumps(dict(plug = name, timestamp = timestamp, value = value))
+                    with self.lock:
+                        print(line)
+                    n += 1
+            return name, n
+        finally:
+            p110.dispose()
+
+    def run(self):
+        counts = dict(invokeall([self.e.submit(self._history, name, conf).result for name, conf in self.plugs]))
+        sys.stdout.flush()
+        return counts
+
+def main():
+    initlogging()
+    config = configcache.loadappconfig((identityfactory.__module__, 'p110'), 'p110.arid')
+    parser = ArgumentParser()
+    parser.add_argument('--cron', action = 'store_true')
+    parser.add_argument('-f', action = 'store_true')
+    parser.add_argument('--fail', action = 'store_true')
+    parser.add_argument('--retry')
+    parser.add_argument('-v', action = 'store_true')
+    parser.add_argument('--workers')
+    parser.add_argument('interval', choices = sorted(intervals))
+    parser.parse_args(namespace = config.cli)
+    logging.getLogger().setLevel(logging.DEBUG if config.verbose else logging.INFO)
+    workers = config.workers
+    with DI() as di, ThreadPoolExecutor(None if workers is None else int(workers)) as e:
+        di.add(config)
+        di.add(e)
+        di.add(identityfactory)
+        di.add(Retry)
+        di.add(LoginParams)
+        di.add(Script)
+        logging.info("Buckets: %s", di(Script).run())
+
+if '__main__' == __name__:
+    main()
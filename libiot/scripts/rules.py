@@ -0,0 +1,177 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+'Switch configured Tapo P100/P110 plugs from sensor readings in one process, with hysteresis, reporting sensor-to-switch latency.'
+from . import govee, initlogging, mijia, p110
+from .. import configcache
+from ..bluetoothctl import BluetoothShell
+from ..p110 import Identity, LoginParams, P110
+from ..rolling import metrics
+from ..rules import Engine, Patience, Rule
+from ..temper import Discovery, paced, readall, Temper
+from ..trace import tracer
+from ..util import AbortException
+from argparse import ArgumentParser
+from aridity.config import ConfigCtrl
+from contextlib import ExitStack
+from functools import partial
+from threading import Event, Thread
+import json, logging, sys, time
+
+log = logging.getLogger(__name__)
+sources = 'govee', 'mijia', 'temper'
+
+def _config(module, appname):
+    return configcache.loadappconfig((module.__name__, appname), f"{appname}.arid")
+
+def _switch(client, on):
+    if on:
+        client.on()
+    else:
+        client.off()
+
+class Script:
+
+    backoff = 5
+
+    def __init__(self, config, stack):
+        self.rules = []
+        self.sensors = {}
+        for name, r in -config.rule:
+            if r.metric not in metrics:
+                sys.exit(f"[{name}] Expected metric one of {', '.join(metrics)}: {r.metric}")
+            if r.source not in sources:
+                sys.exit(f"[{name}] Expected source one of {', '.join(sources)}: {r.source}")
+            self.rules.append(Rule(name, r.sensor, r.metric, r.plug, float(r.on), float(r.off)))
+            self.sensors.setdefault(r.source, set()).add(r.sensor)
+        self.stack = stack
+        self.shell = BluetoothShell(config, Patience(float(config.timeout)))
+        self.heartbeat = float(config.heartbeat)
+        self.rate = float(config.rate)
+        self.timeout = float(config.timeout)
+        self.engine = Engine(self.rules, self._switches({rule.plug for rule in self.rules}))
+
+    def _switches(self, plugnames):
+        'Open a session with every plug up front, learning its state, so that switching costs one request.'
+        config = _config(p110, 'p110')
+        unknown = plugnames - {name for name, _ in -config.plug}
+        if unknown:
+            sys.exit(f"Unknown plugs: {', '.join(sorted(unknown))}")
+        config.cli.cron = config.cli.f = False
+        identity = Identity.loadorcreate()
+        loginparams = LoginParams(config)
+        self.stack.callback(loginparams.dispose)
+        switches = {}
+        for name, conf in -config.plug:
+            if name not in plugnames:
+                continue
+            device = P110.loadorcreate(conf, identity)
+            self.stack.callback(device.dispose)
+            client = getattr(device, conf.protocol)(conf, loginparams)
+            with tracer.scope(name):
+                ison = client.ison()
+            for rule in self.rules:
+                if name == rule.plug:
+                    rule.state = ison
+            switches[name] = partial(_switch, client)
+        return switches
+
+    def _mijia(self, name, address):
+        reader = self.shell.LYWSD03MMC(address)
+        self.stack.callback(reader.dispose)
+        while True:
+            try:
+                with tracer.scope(name):
+                    reading = reader()
+            except AbortException:
+                log.warning("[%s] Lost sensor, resume shortly.", name)
+                time.sleep(self.backoff)
+                continue
+            reader.process.forget()
+            self.engine.feed(name, reading, time.monotonic())
+
+    def _govee(self, names):
+        for address, reading in self.shell.monitor_h5075(names, self.heartbeat):
+            self.engine.feed(names[address], reading, time.monotonic())
+
+    def _temper(self, keys):
+        handles = {key: self.stack.enter_context(Temper(path, timeout = self.timeout).open()) for key, path in Discovery().find().items() if key in keys}
+        for readings in paced(self.rate, partial(readall, handles, self.timeout)):
+            t0 = time.monotonic()
+            for key, value in readings.items():
+                if value is not None:
+                    self.engine.feed(key, dict(temperature = value), t0)
+
+    def _sources(self):
+        if 'mijia' in self.sensors:
+            addresses = {name: s.address for name, s in -_config(mijia, 'mijia').sensor}
+            for name in self.sensors['mijia']:
+                yield self._mijia, name, addresses[name]
+        if 'govee' in self.sensors:
+            addresses = {name: s.address for name, s in -_config(govee, 'govee').sensor}
+            yield self._govee, {addresses[name]: name for name in self.sensors['govee']}
+        if 'temper' in self.sensors:
+            yield self._temper, self.sensors['temper']
+
+    def run(self, duration):
+        'Feed the engine from every source until duration elapses, or forever. Return False as soon as any source stops.'
+        stopped = Event()
+        def supervise(f, *args):
+            try:
+                f(*args)
+            finally:
+                log.error("Source stopped: %s", f.__name__)
+                stopped.set()
+        for f, *args in self._sources():
+            Thread(target = supervise, args = [f, *args], daemon = True).start()
+        return not stopped.wait(duration)
+
+def main():
+    initlogging()
+    config = ConfigCtrl().loadappconfig(main, 'rules.arid')
+    parser = ArgumentParser()
+    parser.add_argument('--duration')
+    parser.add_argument('--trace')
+    parser.add_argument('-v', action = 'store_true')
+    parser.parse_args(namespace = config.cli)
+    logging.getLogger().setLevel(logging.DEBUG if config.verbose else logging.INFO)
+    tracer.enabled = config.trace is not None
+    with ExitStack() as stack:
+        script = Script(config, stack)
+        try:
+            ok = script.run(None if config.duration is None else float(config.duration))
+        except KeyboardInterrupt:
+            ok = True
+    print(json.dumps(script.engine.report()))
+    if tracer.enabled:
+        tracer.dump(config.trace)
+    if not ok:
+        sys.exit(1)
+
+if '__main__' == __name__:
+    main()
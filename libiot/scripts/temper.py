@@ -26,13 +26,42 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-'Get data from TEMPer USB temperature sensor.'
+'Get data from TEMPer USB temperature sensors.'
 from . import initlogging
-from ..temper import Temper
+from .. import sink
+from ..profiling import profiling
+from ..temper import Discovery, paced, readall, Temper
+from argparse import ArgumentParser
+from contextlib import ExitStack
+from functools import partial
+import json
 
 def main():
     initlogging()
-    print(Temper('/dev/hidraw1').read())
+    parser = ArgumentParser()
+    parser.add_argument('--export')
+    parser.add_argument('--flush-interval', type = float, default = 10)
+    parser.add_argument('--flush-size', type = int, default = 1000)
+    parser.add_argument('--format', choices = sorted(sink.formats), default = 'line')
+    parser.add_argument('--path')
+    parser.add_argument('--profile')
+    parser.add_argument('--rate', type = float)
+    parser.add_argument('--timeout', type = float, default = 1)
+    args = parser.parse_args()
+    with profiling(args.profile), ExitStack() as stack:
+        s = None if args.export is None else stack.enter_context(sink.create(args.export, args.format, args.flush_size, args.flush_interval))
+        if args.path is not None:
+            h = stack.enter_context(Temper(args.path, timeout = args.timeout).open())
+            read = lambda: {args.path: h.read()}
+            text = lambda readings: str(readings[args.path])
+        else:
+            handles = {key: stack.enter_context(Temper(path, timeout = args.timeout).open()) for key, path in Discovery().find().items()}
+            read = partial(readall, handles, args.timeout)
+            text = json.dumps
+        for readings in [read()] if args.rate is None else paced(args.rate, read):
+            print(text(readings), flush = True)
+            if s is not None:
+                s.addall('temper', readings, 'temperature')
 
 if '__main__' == __name__:
     main()
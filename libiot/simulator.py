@@ -0,0 +1,266 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .p110 import intervals
+from .util import b64str, Cipher, dig, KLAPCipher
+from hashlib import sha1, sha256
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from random import Random
+from secrets import token_bytes
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+import json, logging, resource, selectors, socket, time
+
+log = logging.getLogger(__name__)
+charset = 'utf-8'
+
+class PlugState:
+
+    def __init__(self, deviceid, nickname, power):
+        self.lock = Lock()
+        self.deviceid = deviceid
+        self.device_on = False
+        self.nickname = b64str(nickname.encode(charset))
+        self.power = power
+
+    def get_device_info(self):
+        return dict(device_id = self.deviceid, device_on = self.device_on, nickname = self.nickname)
+
+    def set_device_info(self, device_on):
+        self.device_on = device_on
+
+    def get_device_time(self):
+        return dict(timestamp = int(time.time()), region = 'Europe/London')
+
+    def get_energy_usage(self):
+        return dict(current_power = self.power if self.device_on else 0)
+
+    def get_energy_data(self, start_timestamp, end_timestamp, interval):
+        i, = (i for i in intervals.values() if interval == i.minutes)
+        data = []
+        t = start_timestamp
+        while t < end_timestamp:
+            data.append(t // 3600 % 97)
+            t = i.add(t, 1)
+        return dict(data = data, start_timestamp = start_timestamp, end_timestamp = end_timestamp, interval = interval)
+
+    def dispatch(self, method, params):
+        if 'multipleRequest' == method:
+            return dict(error_code = 0, result = dict(responses = [dict(self.dispatch(r['method'], r['params']), method = r['method']) for r in params['requests']]))
+        try:
+            f = getattr(self, method)
+        except AttributeError:
+            return dict(error_code = -1002)
+        with self.lock:
+            return dict(error_code = 0, result = f(**params))
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        plug = self.server.plug
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(plug.latency)
+        if plug.fail():
+            self.close_connection = True
+            return
+        status, content, headers = plug.handle(url.path, {k: v for k, (v,) in parse_qs(url.query).items()}, body, SimpleCookie(self.headers.get('Cookie')))
+        self.send_response(status)
+        for item in headers.items():
+            self.send_header(*item)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+class Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, plug):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.plug = plug
+
+class Plug:
+
+    def __init__(self, nickname, latency, failrate, seed, username, password):
+        self.state = PlugState(f"{seed:040X}", nickname, 1000 + seed % 50000)
+        self.latency = latency
+        self.failrate = failrate
+        self.random = Random(seed)
+        self.randomlock = Lock()
+        usernamebytes = username.encode(charset)
+        passwordbytes = password.encode(charset)
+        self.credentials = b64str(sha1(usernamebytes).hexdigest().encode('ascii')), b64str(passwordbytes)
+        self.authhash = dig(sha256, dig(sha1, usernamebytes) + dig(sha1, passwordbytes))
+
+    def fail(self):
+        with self.randomlock:
+            return self.random.random() < self.failrate
+
+    @staticmethod
+    def _json(obj):
+        return 200, json.dumps(obj).encode('ascii'), {}
+
+class ClientPlug(Plug):
+
+    protocol = 'Client'
+
+    def handle(self, path, query, body, cookie):
+        from Crypto.Cipher import PKCS1_v1_5
+        from Crypto.PublicKey import RSA
+        request = json.loads(body)
+        if 'handshake' == request['method']:
+            keyiv = token_bytes(32)
+            self.cipher = Cipher.create(keyiv)
+            self.token = None
+            return self._json(dict(error_code = 0, result = dict(key = b64str(PKCS1_v1_5.new(RSA.importKey(request['params']['key'])).encrypt(keyiv)))))
+        inner = self.cipher.decrypt(request['params']['request'])
+        if 'login_device' == inner['method']:
+            if (inner['params']['username'], inner['params']['password']) == self.credentials:
+                self.token = b64str(token_bytes(12))
+                response = dict(error_code = 0, result = dict(token = self.token))
+            else:
+                response = dict(error_code = -1501)
+        elif self.token is None or query.get('token') != self.token:
+            response = dict(error_code = 9999)
+        else:
+            response = self.state.dispatch(inner['method'], inner['params'])
+        return self._json(dict(error_code = 0, result = dict(response = self.cipher.encrypt(response))))
+
+class KLAPPlug(Plug):
+
+    protocol = 'KLAP'
+    cookiename = 'TP_SESSIONID'
+    forbidden = 403, b'', {}
+    handshakes = 0
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.sessions = {}
+
+    def handle(self, path, query, body, cookie):
+        if '/app/handshake1' == path:
+            self.handshakes += 1
+            sessionid = token_bytes(16).hex()
+            self.sessions[sessionid] = session = SimpleNamespace(seeds = (body, token_bytes(16)), cipher = None, seqs = set())
+            return 200, session.seeds[1] + dig(sha256, body + session.seeds[1] + self.authhash), {'Set-Cookie': f"{self.cookiename}={sessionid};TIMEOUT=86400"}
+        morsel = cookie.get(self.cookiename)
+        session = None if morsel is None else self.sessions.get(morsel.value)
+        if session is None:
+            return self.forbidden
+        if '/app/handshake2' == path:
+            localseed, remoteseed = session.seeds
+            if body != dig(sha256, remoteseed + localseed + self.authhash):
+                return self.forbidden
+            session.cipher = KLAPCipher(localseed + remoteseed + self.authhash)
+            return 200, b'', {}
+        if session.cipher is None:
+            return self.forbidden
+        seq = int(query['seq'])
+        with self.randomlock:
+            if seq in session.seqs:
+                return self.forbidden
+            session.seqs.add(seq)
+        channel = session.cipher.Channel(seq)
+        request = channel.decrypt(body)
+        return 200, channel.encrypt(self.state.dispatch(request['method'], request['params'])), {}
+
+class Fleet:
+
+    def __init__(self, count, klapratio = .5, latency = 0, failrate = 0, username = 'user@example.com', password = 'secret'):
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        self.servers = []
+        for i in range(count):
+            cls = KLAPPlug if i < count * klapratio else ClientPlug
+            self.servers.append(Server(cls(f"plug{i}", latency, failrate, i, username, password)))
+        self.selector = selectors.DefaultSelector()
+        for server in self.servers:
+            self.selector.register(server, selectors.EVENT_READ, server)
+        self.responder = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.responder.bind(('127.0.0.1', 0))
+        self.selector.register(self.responder, selectors.EVENT_READ, self._respond)
+        self.running = True
+        self.thread = Thread(target = self._loop)
+        self.thread.start()
+
+    def plugs(self):
+        'Map plug name to host and protocol.'
+        return {f"plug{i}": (f"127.0.0.1:{s.server_address[1]}", s.plug.protocol) for i, s in enumerate(self.servers)}
+
+    def discoveryport(self):
+        return self.responder.getsockname()[1]
+
+    def move(self, i):
+        'Rebind the given plug to a new port, as if DHCP had given it a new address.'
+        old = self.servers[i]
+        self.servers[i] = new = Server(old.plug)
+        self.selector.register(new, selectors.EVENT_READ, new)
+        self.selector.unregister(old)
+        old.server_close()
+
+    def _respond(self):
+        _, address = self.responder.recvfrom(4096)
+        for s in self.servers:
+            result = dict(device_id = s.plug.state.deviceid, ip = f"127.0.0.1:{s.server_address[1]}")
+            self.responder.sendto(bytes(16) + json.dumps(dict(error_code = 0, result = result)).encode('ascii'), address)
+
+    def _loop(self):
+        while self.running:
+            for key, _ in self.selector.select(.1):
+                try:
+                    if key.fileobj is self.responder:
+                        key.data()
+                    else:
+                        key.data._handle_request_noblock()
+                except OSError as e:
+                    log.debug("Moved: %s", e)
+
+    def dispose(self):
+        self.running = False
+        self.thread.join()
+        self.selector.close()
+        self.responder.close()
+        for server in self.servers:
+            server.server_close()
+
+def serve(conn, *args, **kwargs):
+    'Run a fleet in a child process, sending its plugs over the pipe and stopping when the pipe is next readable.'
+    fleet = Fleet(*args, **kwargs)
+    try:
+        conn.send(fleet.plugs())
+        conn.recv()
+    finally:
+        fleet.dispose()
@@ -0,0 +1,135 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from threading import Lock
+import csv, io, json, time
+
+def flatten(value, prefix):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from flatten(v, f"{prefix}_{k}" if prefix else k)
+    elif value is not None:
+        yield prefix, value
+
+class Sink:
+
+    def __init__(self, path, size, interval):
+        self.f = open(path, 'a', newline = '')
+        self.size = size
+        self.interval = interval
+        self.lock = Lock()
+        self.rows = []
+        self.flushed = time.monotonic()
+
+    def add(self, measurement, device, value, field = 'value', timestamp = None):
+        'Buffer one reading, flattening nested dicts into underscore-joined field names.'
+        if timestamp is None:
+            timestamp = time.time_ns()
+        rows = [(timestamp, measurement, device, k, v) for k, v in flatten(value, '' if isinstance(value, dict) else field)]
+        with self.lock:
+            self.rows.extend(rows)
+            if len(self.rows) >= self.size or time.monotonic() - self.flushed >= self.interval:
+                self._flush()
+
+    def addall(self, measurement, results, field = 'value', timestamp = None):
+        if timestamp is None:
+            timestamp = time.time_ns()
+        for device, value in results.items():
+            self.add(measurement, device, value, field, timestamp)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            self.f.write(self.format(self.rows))
+            self.f.flush()
+            self.rows.clear()
+        self.flushed = time.monotonic()
+
+    def dispose(self):
+        self.flush()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.dispose()
+
+def _escape(text, special):
+    for c in '\\' + special:
+        text = text.replace(c, f"\\{c}")
+    return text
+
+def _fieldvalue(v):
+    if isinstance(v, bool):
+        return 'true' if v else 'false'
+    if isinstance(v, int):
+        return f"{v}i"
+    if isinstance(v, float):
+        return repr(v)
+    return '"%s"' % _escape(str(v), '"')
+
+class LineProtocolSink(Sink):
+
+    def format(self, rows):
+        points = {}
+        for timestamp, measurement, device, k, v in rows:
+            points.setdefault((measurement, device, timestamp), []).append(f"{_escape(k, ',= ')}={_fieldvalue(v)}")
+        return ''.join(f"{_escape(m, ', ')},device={_escape(str(d), ',= ')} {','.join(fields)} {t}\n" for (m, d, t), fields in points.items())
+
+class CSVSink(Sink):
+
+    header = 'timestamp', 'measurement', 'device', 'field', 'value'
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        if not self.f.tell():
+            csv.writer(self.f).writerow(self.header)
+            self.f.flush()
+
+    def format(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+class ColumnarSink(Sink):
+
+    def format(self, rows):
+        return json.dumps(dict(zip(CSVSink.header, map(list, zip(*rows))))) + '\n'
+
+formats = dict(
+    columns = ColumnarSink,
+    csv = CSVSink,
+    line = LineProtocolSink,
+)
+
+def create(path, format, size = 1000, interval = 10):
+    return formats[format](path, size, interval)
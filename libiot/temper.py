@@ -26,25 +26,161 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import logging, os, select, struct
+from pathlib import Path
+import json, logging, os, select, struct, time
 
 log = logging.getLogger(__name__)
+query = struct.pack('8B', 0x01, 0x80, 0x33, 0x01, 0, 0, 0, 0)
+reportsize = 8
 
 class Temper:
 
-    def __init__(self, path):
+    class Handle:
+
+        def __init__(self, path, reports, timeout):
+            self.fd = os.open(path, os.O_RDWR)
+            self.size = reports * reportsize
+            self.timeout = timeout
+
+        def _drain(self):
+            while self.fd in select.select([self.fd], [], [], 0)[0]:
+                log.debug("Discard stale: %s", os.read(self.fd, reportsize).hex())
+
+        def request(self):
+            self._drain()
+            os.write(self.fd, query)
+            self.data = bytearray()
+
+        def receive(self):
+            self.data += os.read(self.fd, self.size - len(self.data))
+            return len(self.data) >= self.size
+
+        def read(self):
+            self.request()
+            deadline = time.monotonic() + self.timeout
+            while True:
+                r, _, _ = select.select([self.fd], [], [], max(0, deadline - time.monotonic()))
+                if self.fd not in r:
+                    raise TimeoutError(f"Got {len(self.data)} of {self.size} bytes.")
+                if self.receive():
+                    return decode(self.data)
+
+        def sample(self, rate):
+            return paced(rate, self.read)
+
+        def dispose(self):
+            os.close(self.fd)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.dispose()
+
+    def __init__(self, path, reports = 1, timeout = 1):
         self.path = path
+        self.reports = reports
+        self.timeout = timeout
+
+    def open(self):
+        return self.Handle(self.path, self.reports, self.timeout)
 
     def read(self):
-        def g():
-            fd = os.open(self.path, os.O_RDWR)
-            os.write(fd, struct.pack('8B', 0x01, 0x80, 0x33, 0x01, 0, 0, 0, 0))
-            while True:
-                r, _, _ = select.select([fd], [], [], .1)
-                if fd not in r:
-                    break
-                yield os.read(fd, 8)
-            os.close(fd)
-        data = b''.join(g())
-        log.info("Reading: %s", data.hex())
-        return struct.unpack_from('>h', data, 2)[0] / 100
+        with self.open() as h:
+            return h.read()
+
+class Discovery:
+
+    ids = {
+        (0x0c45, 0x7401),
+        (0x0c45, 0x7402),
+        (0x1a86, 0xe025),
+        (0x413d, 0x2107),
+    }
+    interface = 1
+
+    def __init__(self, sysroot = Path('/sys'), devroot = Path('/dev'), cachepath = None):
+        self.classdir = sysroot / 'class' / 'hidraw'
+        self.devroot = devroot
+        if cachepath is None:
+            from .util import Persistent
+            cachepath = Persistent.cacheroot / 'temper.json'
+        self.cachepath = cachepath
+
+    def _identify(self, nodename):
+        try:
+            hid = (self.classdir / nodename / 'device').resolve(True)
+        except FileNotFoundError:
+            return
+        _, vendor, product = hid.name.split('.')[0].split(':')
+        if (int(vendor, 16), int(product, 16)) not in self.ids:
+            return
+        usbinterface = hid.parent
+        port, configinterface = usbinterface.name.split(':')
+        if self.interface != int(configinterface.split('.')[1]):
+            return
+        try:
+            return (usbinterface.parent / 'serial').read_text().strip()
+        except FileNotFoundError:
+            return port
+
+    def find(self):
+        'Map stable serial or USB port to hidraw path, identifying only nodes whose device is not in the cached scan.'
+        try:
+            cached = json.loads(self.cachepath.read_text())
+        except FileNotFoundError:
+            cached = {}
+        scanned = {}
+        for node in sorted(self.classdir.iterdir()):
+            try:
+                device = str((node / 'device').resolve(True))
+            except FileNotFoundError:
+                continue
+            entry = cached.get(node.name)
+            scanned[node.name] = entry if entry is not None and device == entry[0] else [device, self._identify(node.name)]
+        if scanned != cached:
+            log.debug("Update: %s", self.cachepath)
+            from lagoon.util import atomic
+            with atomic(self.cachepath) as p:
+                p.write_text(json.dumps(scanned))
+        return {key: str(self.devroot / name) for name, (_, key) in scanned.items() if key is not None}
+
+def readall(handles, timeout):
+    'Query every handle at once and collect replies in one epoll loop, mapping keys that did not answer to None.'
+    results = dict.fromkeys(handles)
+    pending = {}
+    with select.epoll() as epoll:
+        for key, h in handles.items():
+            h.request()
+            epoll.register(h.fd, select.EPOLLIN)
+            pending[h.fd] = key, h
+        deadline = time.monotonic() + timeout
+        while pending:
+            events = epoll.poll(max(0, deadline - time.monotonic()))
+            if not events:
+                break
+            for fd, _ in events:
+                key, h = pending[fd]
+                if h.receive():
+                    results[key] = decode(h.data)
+                    epoll.unregister(fd)
+                    del pending[fd]
+    for key, _ in pending.values():
+        log.warning("[%s] No reply.", key)
+    return results
+
+def paced(rate, f):
+    period = 1 / rate
+    due = time.monotonic()
+    while True:
+        yield f()
+        due += period
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            due -= delay
+
+def decode(data):
+    log.info("Reading: %s", data.hex())
+    return struct.unpack_from('>h', data, 2)[0] / 100
@@ -0,0 +1,242 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .bluetoothctl import BluetoothShell
+from .util import AbortException
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+import os, sys, time
+
+govee = '''import sys
+adverts = [
+    ('A4:C1:38:00:00:01', '00 03 41 ef 64 00'),
+    ('A4:C1:38:00:00:02', '00 03 e4 18 5a 00'),
+    ('A4:C1:38:00:00:01', '00 03 41 ef 64 00'),
+    ('A4:C1:38:00:00:03', '00 03 41 ef 64 00'),
+    ('A4:C1:38:00:00:01', '00 03 e4 18 5a 00'),
+]
+for line in sys.stdin:
+    if 'scan on' == line.strip():
+        for address, data in adverts:
+            print(f"[CHG] Device {address} ManufacturerData Key: 0xec88")
+            print(f"[CHG] Device {address} ManufacturerData Value:")
+            print(f"  {data}                 ..A.d.")
+        sys.stdout.flush()
+'''
+mijia = '''import sys
+with open(sys.argv[0] + '.log', 'a') as log:
+    print('spawn', file = log)
+known = False
+notifies = 0
+for line in sys.stdin:
+    command = line.strip()
+    with open(sys.argv[0] + '.log', 'a') as log:
+        print(command, file = log)
+    if command.startswith('connect '):
+        address = command.split()[1]
+        print('Connection successful' if known else f"Device {address} not available")
+    elif 'scan on' == command:
+        print(f"[NEW] Device {address} LYWSD03MMC")
+        known = True
+    elif command.startswith('select-attribute '):
+        path = command.split()[1]
+    elif 'notify on' == command:
+        notifies += 1
+        if 1 == notifies:
+            print('No attribute selected')
+        else:
+            print(f"[CHG] Attribute {path} Value:")
+            print('  6a ff 2d ab 0b                                  j.-..')
+    elif 'disconnect' == command:
+        print('Successful disconnected')
+    sys.stdout.flush()
+'''
+mijiasilent = '''import sys
+notifies = 0
+for line in sys.stdin:
+    command = line.strip()
+    with open(sys.argv[0] + '.log', 'a') as log:
+        print(command, file = log)
+    if command.startswith('connect '):
+        print('Connection successful')
+    elif command.startswith('select-attribute '):
+        path = command.split()[1]
+    elif 'notify on' == command:
+        notifies += 1
+        if 1 < notifies:
+            print(f"[CHG] Attribute {path} Value:")
+            print('  6a ff 2d ab 0b                                  j.-..')
+    elif command.startswith('disconnect'):
+        print('Successful disconnected')
+    sys.stdout.flush()
+'''
+mijiahistory = '''import struct, sys
+records = [struct.pack('<IIhBhB', i, 1700000000 + i * 3600, 215 + i, 50, 200, 40 + i) for i in range(3)]
+for line in sys.stdin:
+    command = line.strip()
+    if command.startswith('connect '):
+        print('Connection successful')
+    elif command.startswith('select-attribute '):
+        selected = command.split()[1]
+    elif command.startswith('write ') and selected.startswith('ebe0ccba'):
+        start = int.from_bytes(bytes(int(x, 16) for x in command[6:].strip('"').split()), 'little')
+    elif 'notify on' == command:
+        for record in records[start:]:
+            print('[CHG] Attribute /org/bluez/hci0/dev_A4_C1_38_00_00_01/service0030/char003b Value:')
+            print('  ' + ' '.join(f"{b:02x}" for b in record) + '  ..............')
+    elif 'disconnect' == command:
+        print('Successful disconnected')
+    sys.stdout.flush()
+'''
+goveehistory = '''import sys
+for line in sys.stdin:
+    command = line.strip()
+    if command.startswith('connect '):
+        print('Connection successful')
+    elif command.startswith('select-attribute '):
+        selected = command.split()[1]
+    elif command.startswith('write ') and selected.endswith('2011'):
+        request = bytes(int(x, 16) for x in command[6:].strip('"').split())
+        start, end = int.from_bytes(request[2:4], 'big'), int.from_bytes(request[4:6], 'big')
+        for offset in range(start, end - 1, -6):
+            packet = offset.to_bytes(2, 'big') + b''.join(((200 + m) * 1000 + 500).to_bytes(3, 'big') if m >= end else b'\\xff' * 3 for m in range(offset, offset - 6, -1))
+            print('[CHG] Attribute /org/bluez/hci0/dev_A4_C1_38_00_00_02/service0010/char0013 Value:')
+            print('  ' + ' '.join(f"{b:02x}" for b in packet[:16]) + '  ................')
+            print('  ' + ' '.join(f"{b:02x}" for b in packet[16:]) + '  ....')
+    elif 'disconnect' == command:
+        print('Successful disconnected')
+    sys.stdout.flush()
+'''
+
+class FakeTestCase(TestCase):
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.fake = Path(self.tempdir.name, 'bluetoothctl')
+        self.fake.write_text(f"#!{sys.executable}\n{self.script}")
+        self.fake.chmod(0o755)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = f"{self.tempdir.name}{os.pathsep}{self.path}"
+        self.shell = BluetoothShell(SimpleNamespace(context = 100, adapter = 'hci0'), SimpleNamespace(remaining = lambda: 5))
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        self.tempdir.cleanup()
+
+class TestMonitor(FakeTestCase):
+
+    script = govee
+
+    def test_dedupe(self):
+        shell = self.shell
+        readings = list(shell.monitor_h5075({'A4:C1:38:00:00:01', 'A4:C1:38:00:00:02'}, 60, 1))
+        a = dict(temperature = 21.3, humidity = 48.7, battery = 100)
+        b = dict(temperature = 25.5, humidity = 0, battery = 90)
+        self.assertEqual([('A4:C1:38:00:00:01', a), ('A4:C1:38:00:00:02', b), ('A4:C1:38:00:00:01', b)], readings)
+
+class TestLYWSD03MMC(FakeTestCase):
+
+    script = mijia
+
+    def test_resume(self):
+        reader = self.shell.LYWSD03MMC('A4:C1:38:00:00:01')
+        try:
+            with self.assertRaises(AbortException):
+                reader()
+            self.assertEqual(dict(temperature = -1.5, humidity = 45, voltage = 2.987), reader())
+        finally:
+            reader.dispose()
+        log = Path(f"{self.fake}.log").read_text().splitlines()
+        self.assertEqual(1, log.count('spawn'))
+        self.assertEqual(1, log.count('scan on'))
+        self.assertEqual(['connect A4:C1:38:00:00:01'] * 3, [l for l in log if l.startswith('connect ')])
+        self.assertEqual('disconnect', log[-1])
+
+class TestSilent(FakeTestCase):
+
+    script = mijiasilent
+
+    def test_reconnect(self):
+        shell = BluetoothShell(SimpleNamespace(context = 100, adapter = 'hci0'), SimpleNamespace(remaining = lambda: .5))
+        reader = shell.LYWSD03MMC('A4:C1:38:00:00:01')
+        try:
+            with self.assertRaises(AbortException):
+                reader()
+            self.assertEqual(dict(temperature = -1.5, humidity = 45, voltage = 2.987), reader())
+        finally:
+            reader.dispose()
+        log = Path(f"{self.fake}.log").read_text().splitlines()
+        self.assertEqual(['connect A4:C1:38:00:00:01', 'disconnect A4:C1:38:00:00:01', 'connect A4:C1:38:00:00:01'], [l for l in log if l.startswith(('connect ', 'disconnect '))])
+
+class TestLYWSD03MMCHistory(FakeTestCase):
+
+    script = mijiahistory
+
+    def test_since(self):
+        reader = self.shell.LYWSD03MMCHistory('A4:C1:38:00:00:01', 0)
+        reader.idle = .5
+        try:
+            columns = reader()
+        finally:
+            reader.dispose()
+        self.assertEqual([1, 2], list(columns['index']))
+        self.assertEqual([1700003600, 1700007200], list(columns['time']))
+        self.assertEqual([21.6, 21.7], list(columns['max_temperature']))
+        self.assertEqual([41, 42], list(columns['min_humidity']))
+
+class TestH5075History(FakeTestCase):
+
+    script = goveehistory
+
+    def test_since(self):
+        reader = self.shell.H5075History('A4:C1:38:00:00:02', time.time() // 60 * 60 - 600)
+        reader.idle = .5
+        try:
+            columns = reader()
+        finally:
+            reader.dispose()
+        minutes = range(9, 0, -1)
+        self.assertEqual([reader.now - m * 60 for m in minutes], list(columns['timestamp']))
+        self.assertEqual([(200 + m) / 10 for m in minutes], list(columns['temperature']))
+        self.assertEqual([50] * 9, list(columns['humidity']))
+
+    def test_late(self):
+        now = time.time() // 60 * 60
+        reader = self.shell.H5075History('A4:C1:38:00:00:02', now - 600)
+        reader.idle = .5
+        try:
+            with patch('time.time', return_value = now + 90):
+                columns = reader()
+        finally:
+            reader.dispose()
+        minutes = range(10, 0, -1)
+        self.assertEqual([now + 60 - m * 60 for m in minutes], list(columns['timestamp']))
+        self.assertEqual([(200 + m) / 10 for m in minutes], list(columns['temperature']))
@@ -0,0 +1,90 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from . import configcache
+from .scripts import mijia, p110
+from .util import Persistent
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+import os
+
+class TestConfigCache(TestCase):
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.cacheroot = Persistent.cacheroot
+        Persistent.cacheroot = Path(self.tempdir.name, 'cache')
+        self.settings = Path(self.tempdir.name, '.settings.arid')
+
+    def tearDown(self):
+        Persistent.cacheroot = self.cacheroot
+        self.tempdir.cleanup()
+
+    def _load(self, module, appname):
+        with patch.dict(os.environ, HOME = self.tempdir.name, **{configcache.envname: '1'}):
+            return configcache.loadappconfig((module.__name__, appname), f"{appname}.arid")
+
+    def _sensors(self):
+        config = self._load(mijia, 'mijia')
+        return {name: s.address for name, s in -config.sensor}, config.adapter, config.context
+
+    def _write(self, text, mtime):
+        self.settings.write_text(text)
+        os.utime(self.settings, ns = (mtime, mtime))
+
+    def _writesensor(self, address, mtime):
+        self._write(f"mijia\n    adapter = hci1\n    sensor kitchen address = {address}\n", mtime)
+
+    def test_snapshot(self):
+        self._writesensor('A4:C1:38:00:00:01', 10 ** 18)
+        expected = dict(kitchen = 'A4:C1:38:00:00:01'), 'hci1', 100
+        self.assertEqual(expected, self._sensors())
+        self._writesensor('A4:C1:38:00:00:02', 10 ** 18)
+        self.assertEqual(expected, self._sensors())
+        self._writesensor('A4:C1:38:00:00:02', 10 ** 18 + 1)
+        self.assertEqual((dict(kitchen = 'A4:C1:38:00:00:02'), 'hci1', 100), self._sensors())
+
+    def test_settings(self):
+        self._write('''p110
+    discovery subnets += 10.0.0.0/30
+    fanout burst = 7
+    password = $(username)-secret
+    plug kitchen host = 192.168.0.2
+    sampler slow = 5
+    username = me
+''', 10 ** 18)
+        for _ in range(2):
+            config = self._load(p110, 'p110')
+            config.cli.rate = 3
+            self.assertEqual((7, ['10.0.0.0/30'], 5, 3), (config.fanout.burst, list(config.discovery.subnets), config.sampler.slow, config.fanout.rate))
+            self.assertEqual([('kitchen', '192.168.0.2', 'Client')], [(name, p.host, p.protocol) for name, p in -config.plug])
+            self.assertEqual('me', config.username)
+            self.assertEqual('me-secret', config.password)
+        self.assertIsNotNone(configcache.Snapshot.loadcached(Path('config', 'p110'), configcache._stamp([Path(p110.__file__).with_name('p110.arid'), self.settings])))
@@ -0,0 +1,78 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .decoders import h5075, lywsd03mmc, registry
+from functools import partial
+from timeit import repeat
+from unittest import TestCase
+
+def baseline_lywsd03mmc(data):
+    val = partial(int.from_bytes, byteorder = 'little')
+    return dict(
+        temperature = val(data[:2], signed = True) / 100,
+        humidity = val(data[2:3]),
+        voltage = val(data[3:]) / 1000,
+    )
+
+def baseline_h5075(data):
+    x, y = divmod(int.from_bytes(data[1:4], 'big'), 1000)
+    return dict(
+        temperature = x / 10,
+        humidity = y / 10,
+        battery = data[4],
+    )
+
+def _seconds(f):
+    return min(repeat(f, number = 1, repeat = 5))
+
+class TestDecoders(TestCase):
+
+    def test_lywsd03mmc(self):
+        self.assertEqual(dict(temperature = -1.5, humidity = 45, voltage = 2.987), lywsd03mmc.decode(bytes.fromhex('6aff2dab0b')))
+
+    def test_h5075(self):
+        self.assertEqual(dict(temperature = 21.3, humidity = 48.7, battery = 100), registry['manufacturer', 0xec88].decode(memoryview(bytes.fromhex('000341ef6400'))))
+
+    def test_decodeall(self):
+        records = [bytes.fromhex('000341ef6400'), bytes.fromhex('0003e4185a00')]
+        columns = h5075.decodeall(b''.join(records))
+        self.assertEqual([21.3, 25.5], list(columns['temperature']))
+        self.assertEqual([48.7, 0.0], list(columns['humidity']))
+        self.assertEqual([100, 90], list(columns['battery']))
+        self.assertEqual({'temperature', 'humidity', 'battery'}, columns.keys())
+
+    def test_throughput(self):
+        'Compare with the hand-written decoders the layouts replaced.'
+        for layout, baseline, payload in [
+                [lywsd03mmc, baseline_lywsd03mmc, bytes.fromhex('6aff2dab0b')],
+                [h5075, baseline_h5075, bytes.fromhex('000341ef6400')]]:
+            self.assertEqual(baseline(payload), layout.decode(payload))
+            self.assertLess(_seconds(lambda: [layout.decode(payload) for _ in range(20000)]), _seconds(lambda: [baseline(payload) for _ in range(20000)]))
+            n = len(payload)
+            records = payload * 20000
+            self.assertLess(_seconds(lambda: layout.decodeall(records)), _seconds(lambda: [baseline(records[i:i + n]) for i in range(0, len(records), n)]) / 1.5)
@@ -0,0 +1,48 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .delta import Delta
+from unittest import TestCase
+
+class TestDelta(TestCase):
+
+    def test_deadband(self):
+        delta = Delta('test')
+        first = dict(kitchen = dict(temperature = 21.3, humidity = 45, voltage = 2.98), hall = None)
+        self.assertEqual(dict(kitchen = dict(temperature = 21.3, humidity = 45, voltage = 2.98)), delta.reduce(first, 0, .15, 3600))
+        self.assertEqual({}, delta.reduce(dict(kitchen = dict(temperature = 21.4, humidity = 45, voltage = 2.98)), 60, .15, 3600))
+        self.assertEqual(dict(kitchen = dict(temperature = 21.5, humidity = 46)), delta.reduce(dict(kitchen = dict(temperature = 21.5, humidity = 46, voltage = 2.97)), 120, .15, 3600))
+        self.assertEqual(dict(kitchen = dict(temperature = 21.5, humidity = 46, voltage = 2.97)), delta.reduce(dict(kitchen = dict(temperature = 21.5, humidity = 46, voltage = 2.97)), 3600, .15, 3600))
+
+    def test_scalars(self):
+        delta = Delta('test')
+        self.assertEqual(dict(lamp = dict(status = 'on')), delta.reduce(dict(lamp = 'on'), 0, 0, 3600, 'status'))
+        self.assertEqual({}, delta.reduce(dict(lamp = 'on'), 1, 0, 3600, 'status'))
+        self.assertEqual(dict(lamp = dict(status = 'off')), delta.reduce(dict(lamp = 'off'), 2, 0, 3600, 'status'))
+        self.assertEqual(dict(lamp = dict(ison = False)), delta.reduce(dict(lamp = dict(ison = False)), 3, 1, 3600))
+        self.assertEqual(dict(lamp = dict(ison = True)), delta.reduce(dict(lamp = dict(ison = True)), 4, 1, 3600))
@@ -0,0 +1,64 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .fakes import FakeClock
+from .fanout import FanOut, TokenBucket
+from concurrent.futures import Future
+from unittest import TestCase
+
+class SerialExecutor:
+
+    def submit(self, f, *args):
+        future = Future()
+        future.set_result(f(*args))
+        return future
+
+class TestFanOut(TestCase):
+
+    def test_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 3, clock, clock.sleep)
+        starts = []
+        for _ in range(7):
+            bucket.acquire()
+            starts.append(clock.t)
+        self.assertEqual([0, 0, 0, .5, 1, 1.5, 2], starts)
+
+    def test_waves(self):
+        clock = FakeClock()
+        starts = []
+        def task(name):
+            def f():
+                starts.append((name, clock.t))
+                clock.t += 1
+                return name.upper()
+            return f
+        values, latencies = FanOut(SerialExecutor(), stagger = 10, clock = clock, sleep = clock.sleep).run([(1, 'c', task('c')), (0, 'a', task('a')), (0, 'b', task('b'))])
+        self.assertEqual(dict(a = 'A', b = 'B', c = 'C'), values)
+        self.assertEqual([('a', 0), ('b', 10), ('c', 11)], starts)
+        self.assertEqual(dict(a = 1, b = 11, c = 12), latencies)
@@ -0,0 +1,83 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .history import Cursors, download
+from .util import Persistent
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import json
+
+class FakeReader:
+
+    cursor = 'index'
+
+    def __init__(self, address, since):
+        self.address = address
+        self.since = -1 if since is None else since
+
+    def __call__(self):
+        records = self.records[self.address]
+        if records is None:
+            raise ConnectionError
+        indices = [i for i in records if i > self.since]
+        return dict(index = indices, temperature = [20 + i for i in indices])
+
+    def dispose(self):
+        pass
+
+class TestHistory(TestCase):
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.cacheroot = Persistent.cacheroot
+        Persistent.cacheroot = Path(self.tempdir.name)
+
+    def tearDown(self):
+        Persistent.cacheroot = self.cacheroot
+        self.tempdir.cleanup()
+
+    def _download(self, records):
+        stdout = StringIO()
+        with redirect_stdout(stdout), ThreadPoolExecutor() as e:
+            try:
+                return download('test', dict(kitchen = 'A4:C1:38:00:00:01', hall = 'A4:C1:38:00:00:02'), type('Reader', (FakeReader,), dict(records = records)), lambda f: f(), e)
+            finally:
+                self.lines = [json.loads(l) for l in stdout.getvalue().splitlines()]
+
+    def test_partial(self):
+        with self.assertRaises(ConnectionError):
+            self._download({'A4:C1:38:00:00:01': [5, 6, 7], 'A4:C1:38:00:00:02': None})
+        self.assertEqual([dict(index = i, temperature = 20 + i, sensor = 'kitchen') for i in [5, 6, 7]], self.lines)
+        self.assertEqual({'A4:C1:38:00:00:01': 7}, Cursors.loadorcreate('test').positions)
+        self.assertEqual(dict(kitchen = 0, hall = 1), self._download({'A4:C1:38:00:00:01': [5, 6, 7], 'A4:C1:38:00:00:02': [1]}))
+        self.assertEqual([dict(index = 1, temperature = 21, sensor = 'hall')], self.lines)
+        self.assertEqual({'A4:C1:38:00:00:01': 7, 'A4:C1:38:00:00:02': 1}, Cursors.loadorcreate('test').positions)
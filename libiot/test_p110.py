@@ -0,0 +1,124 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .p110 import Identity, intervals, LoginParams, P110
+from .simulator import Fleet
+from .util import Persistent
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import TestCase
+
+class TestP110(TestCase):
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.cacheroot = Persistent.cacheroot
+        Persistent.cacheroot = Path(self.tempdir.name)
+        self.fleet = Fleet(2, username = 'u', password = 'p')
+        loginparams = LoginParams(SimpleNamespace(username = 'u', password = 'p'))
+        identity = Identity.loadorcreate()
+        self.clients = {}
+        for name, (host, protocol) in self.fleet.plugs().items():
+            config = SimpleNamespace(
+                host = host,
+                force = False,
+                timeout = 5,
+                sampler = SimpleNamespace(duration = .2, fast = .05, slow = 1, threshold = 5),
+                discovery = SimpleNamespace(broadcast = '127.0.0.1', port = self.fleet.discoveryport(), subnets = [], timeout = .2),
+            )
+            self.clients[protocol] = getattr(P110.loadorcreate(config, identity), protocol)(config, loginparams)
+
+    def tearDown(self):
+        self.fleet.dispose()
+        Persistent.cacheroot = self.cacheroot
+        self.tempdir.cleanup()
+
+    def test_protocols(self):
+        for protocol, client in self.clients.items():
+            self.assertEqual('off', client.status(), protocol)
+            client.on()
+            self.assertEqual('on', client.status(), protocol)
+            self.assertLess(0, client.power(), protocol)
+            self.assertEqual(f"plug{0 if 'KLAP' == protocol else 1}", client.nickname(), protocol)
+
+    def test_rehandshake(self):
+        for protocol, client in self.clients.items():
+            client.status()
+            server, = (s for s in self.fleet.servers if protocol == s.plug.protocol)
+            if 'KLAP' == protocol:
+                server.plug.sessions.clear()
+            else:
+                server.plug.token = None
+            self.assertEqual('off', client.status(), protocol)
+
+    def test_concurrent(self):
+        client = self.clients['KLAP']
+        server, = (s for s in self.fleet.servers if 'KLAP' == s.plug.protocol)
+        client.status()
+        server.plug.sessions.clear()
+        handshakes = server.plug.handshakes
+        with ThreadPoolExecutor(8) as e:
+            results = list(e.map(lambda f: f(), [client.status, client.power, client.time, client.nickname] * 4))
+        self.assertEqual([['off'] * 4, [0] * 4, ['plug0'] * 4], [results[0::4], results[1::4], results[3::4]])
+        for t in results[2::4]:
+            self.assertRegex(t, r'^[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2} (GMT|BST)$')
+        self.assertEqual(handshakes + 1, server.plug.handshakes)
+        session, = server.plug.sessions.values()
+        self.assertEqual(16, len(session.seqs))
+
+    def test_monitor(self):
+        for protocol, client in self.clients.items():
+            client.on()
+            s = client.monitor()
+            self.assertLessEqual(3, s['requests'], protocol)
+            self.assertLess(0, s['energy'], protocol)
+            self.assertEqual(0, s['error'], protocol)
+
+    def test_history(self):
+        for protocol, client in self.clients.items():
+            hourly = list(client.history('hourly'))
+            self.assertEqual(24 * 7, len(hourly), protocol)
+            self.assertEqual([t // 3600 % 97 for t, _ in hourly], [v for _, v in hourly], protocol)
+            self.assertEqual(hourly[-1][0] + 3600, client.cursors()['hourly'], protocol)
+            self.assertEqual([], list(client.history('hourly')), protocol)
+            monthly = [t for t, _ in client.history('monthly')]
+            self.assertEqual(36, len(monthly), protocol)
+            self.assertEqual(monthly, [intervals['monthly'].floor(t) for t in monthly], protocol)
+
+    def test_relocate(self):
+        for i, s in enumerate(self.fleet.servers):
+            client = self.clients[s.plug.protocol]
+            client.off()
+            self.assertEqual(f"{i:040X}", client.knowndeviceid())
+            self.fleet.move(i)
+        for i, s in enumerate(self.fleet.servers):
+            client = self.clients[s.plug.protocol]
+            self.assertEqual('off', client.status())
+            self.assertEqual(f"127.0.0.1:{s.server_address[1]}", client.address())
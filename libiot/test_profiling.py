@@ -0,0 +1,56 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .profiling import profiling
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr
+from io import StringIO
+from pathlib import Path
+from pstats import Stats
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import tracemalloc
+
+def churn(n):
+    return sum(len(str(i) * 10) for i in range(n))
+
+class TestProfiling(TestCase):
+
+    def test_threads(self):
+        with TemporaryDirectory() as tempdir:
+            path = Path(tempdir, 'run')
+            stream = StringIO()
+            with redirect_stderr(stream):
+                with profiling(path, 5), ThreadPoolExecutor(2) as e:
+                    list(e.map(churn, [20000] * 4))
+            threadfiles = sorted(Path(tempdir).glob('run.*.*.prof'))
+            self.assertLessEqual(2, len(threadfiles))
+            self.assertTrue(any('churn' == f[2] for f in Stats(str(path) + '.prof').stats))
+            self.assertLess(0, len(tracemalloc.Snapshot.load(f"{path}.tracemalloc").traces))
+        self.assertIn('churn', stream.getvalue())
+        self.assertIn('allocation sites', stream.getvalue())
@@ -0,0 +1,71 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .mijia import carnotcycle
+from .rolling import Rolling, Window
+from random import Random
+from statistics import mean, pstdev
+from unittest import TestCase
+
+class TestWindow(TestCase):
+
+    def test_matchesrecompute(self):
+        random = Random(0)
+        w = Window(10)
+        history = []
+        for t in range(200):
+            value = random.uniform(-20, 40)
+            history.append((t, value))
+            w.add(t, value)
+            values = [v for u, v in history if u > t - 10]
+            stats = w.stats()
+            self.assertEqual(len(values), stats['count'])
+            self.assertEqual(min(values), stats['min'])
+            self.assertEqual(max(values), stats['max'])
+            self.assertAlmostEqual(mean(values), stats['mean'])
+            self.assertAlmostEqual(pstdev(values), stats['stddev'])
+
+    def test_gap(self):
+        w = Window(60)
+        w.add(0, 5)
+        w.add(1, 7)
+        w.add(100, 3)
+        self.assertEqual(dict(count = 1, min = 3, max = 3, mean = 3, stddev = 0), w.stats())
+
+class TestRolling(TestCase):
+
+    def test_apply(self):
+        r = Rolling('test', 60)
+        results = r.apply(dict(a = dict(temperature = 20, humidity = 50, voltage = 3), b = None), 0)
+        results = r.apply(dict(a = dict(temperature = 22, humidity = 40, voltage = 3), b = dict(temperature = 1)), 10)
+        rolling = results['a']['rolling']
+        self.assertEqual({'temperature', 'humidity', 'absolute_humidity'}, rolling.keys())
+        self.assertEqual(21, rolling['temperature']['mean'])
+        self.assertEqual(40, rolling['humidity']['min'])
+        self.assertAlmostEqual(carnotcycle(20, 50), rolling['absolute_humidity']['max'])
+        self.assertEqual({'temperature'}, results['b']['rolling'].keys())
@@ -0,0 +1,84 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .fakes import FakeClock
+from .rules import Engine, Rule
+from unittest import TestCase
+
+class TestRules(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.switched = []
+
+    def _switch(self, plug):
+        def switch(on):
+            self.clock.t += .25
+            self.switched.append((plug, on))
+        return switch
+
+    def test_heater(self):
+        rule = Rule('heat', 'kitchen', 'temperature', 'heater', 18, 19)
+        rule.state = False
+        engine = Engine([rule], dict(heater = self._switch('heater')), self.clock)
+        for t, temperature in enumerate([18.5, 17.9, 18.2, 18.9, 19, 18.5, 17.5]):
+            self.clock.t = t
+            engine.feed('kitchen', dict(temperature = temperature, humidity = 50), t)
+            engine.feed('hall', dict(temperature = 10), t)
+        self.assertEqual([('heater', True), ('heater', False), ('heater', True)], self.switched)
+        self.assertEqual([.25, .25, .25], rule.latencies)
+        self.assertEqual(dict(heat = dict(switches = 3, mean = .25, max = .25)), engine.report())
+
+    def test_dehumidifier(self):
+        rule = Rule('dry', 'cellar', 'absolute_humidity', 'dehumidifier', 12, 10)
+        engine = Engine([rule], dict(dehumidifier = self._switch('dehumidifier')), self.clock)
+        engine.feed('cellar', dict(temperature = 20, humidity = 60), 0) # About 10.4 g/m³.
+        engine.feed('cellar', dict(temperature = 20), 0)
+        engine.feed('cellar', dict(temperature = 20, humidity = 75), 0) # About 13 g/m³.
+        engine.feed('cellar', dict(temperature = 20, humidity = 65), 0)
+        engine.feed('cellar', dict(temperature = 20, humidity = 50), 0) # About 8.6 g/m³.
+        self.assertEqual([('dehumidifier', True), ('dehumidifier', False)], self.switched)
+
+    def test_failure(self):
+        def switch(on):
+            raise ConnectionError
+        rule = Rule('heat', 'kitchen', 'temperature', 'heater', 18, 19)
+        engine = Engine([rule], dict(heater = switch), self.clock)
+        with self.assertLogs('libiot.rules'):
+            engine.feed('kitchen', dict(temperature = 17), 0)
+        self.assertIsNone(rule.state)
+        engine.switches['heater'] = self._switch('heater')
+        engine.feed('kitchen', dict(temperature = 17), 0)
+        self.assertEqual([('heater', True)], self.switched)
+        self.assertIs(True, rule.state)
+        self.assertEqual(dict(heat = dict(switches = 1, mean = .25, max = .25)), engine.report())
+
+    def test_unknown_metric(self):
+        engine = Engine([Rule('dry', 'cellar', 'abs_humidity', 'dehumidifier', 12, 10)], dict(dehumidifier = self._switch('dehumidifier')), self.clock)
+        with self.assertRaises(KeyError):
+            engine.feed('cellar', dict(temperature = 20, humidity = 90), 0)
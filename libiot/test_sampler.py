@@ -0,0 +1,53 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .fakes import FakeClock
+from .sampler import AdaptiveSampler
+from unittest import TestCase
+
+class TestAdaptiveSampler(TestCase):
+
+    def test_step(self):
+        clock = FakeClock()
+        def load():
+            return 100 if 1000 <= clock.t < 2000 else 10
+        s = AdaptiveSampler(1, 60, 5, clock, clock.sleep).run(load, 3600)
+        exact = (10 * 2600 + 100 * 1000) / 3600
+        self.assertLess(s['requests'], s['fixed_requests'] / 20)
+        self.assertLessEqual(abs(s['energy'] - exact * s['seconds'] / 3600), s['error'])
+        self.assertLess(s['error'], exact * .05)
+
+    def test_stable(self):
+        clock = FakeClock()
+        periods = []
+        sampler = AdaptiveSampler(1, 8, 5, clock, clock.sleep)
+        last = 0
+        for t, _ in sampler.samples(lambda: 42, 40):
+            periods.append(t - last)
+            last = t
+        self.assertEqual([0, 1, 2, 4, 8, 8, 8, 8], periods)
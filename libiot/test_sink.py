@@ -0,0 +1,76 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .sink import create
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import csv, json
+
+class TestSink(TestCase):
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.path = Path(self.tempdir.name, 'out')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _write(self, format, **kwargs):
+        with create(self.path, format, **kwargs) as sink:
+            sink.addall('mijia', {'a b': dict(temperature = 21.5, humidity = 40, rolling = dict(temperature = dict(mean = 21.0))), 'c': None}, timestamp = 100)
+            sink.add('p110', 'plug', True, 'ison', 200)
+            sink.add('p110', 'plug', 'off', 'status', 200)
+        return self.path.read_text()
+
+    def test_line(self):
+        self.assertEqual('''mijia,device=a\\ b temperature=21.5,humidity=40i,rolling_temperature_mean=21.0 100
+p110,device=plug ison=true,status="off" 200
+''', self._write('line'))
+
+    def test_csv(self):
+        self._write('csv')
+        rows = list(csv.reader(self.path.read_text().splitlines()))
+        self.assertEqual(['timestamp', 'measurement', 'device', 'field', 'value'], rows[0])
+        self.assertEqual(['100', 'mijia', 'a b', 'humidity', '40'], rows[2])
+        self.assertEqual(6, len(rows))
+        self._write('csv')
+        self.assertEqual(11, len(self.path.read_text().splitlines()))
+
+    def test_columns(self):
+        self._write('columns')
+        batch, = map(json.loads, self.path.read_text().splitlines())
+        self.assertEqual(['a b', 'a b', 'a b', 'plug', 'plug'], batch['device'])
+        self.assertEqual([21.5, 40, 21.0, True, 'off'], batch['value'])
+
+    def test_batching(self):
+        with create(self.path, 'csv', size = 2, interval = 3600) as sink:
+            sink.add('t', 'x', 1)
+            self.assertEqual(1, len(self.path.read_text().splitlines()))
+            sink.add('t', 'y', 2)
+            self.assertEqual(3, len(self.path.read_text().splitlines()))
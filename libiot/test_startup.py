@@ -0,0 +1,55 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from subprocess import check_output
+from unittest import TestCase
+import json, sys
+
+heavy = 'Crypto', 'keyring', 'lagoon', 'pexpect', 'pytz', 'requests'
+baseline = 'aridity.config', 'diapyr'
+budgets = dict(govee = 3, libiot = 1, mijia = 3, p110 = 3, temper = 1)
+probe = '''import json, sys, time
+t = time.perf_counter()
+for name in sys.argv[1].split(','):
+    __import__(name)
+print(json.dumps([time.perf_counter() - t, sorted(name for name in sys.modules if name.split('.')[0] in sys.argv[2:])]))'''
+
+def _import(*modules):
+    'Return the fastest of a few fresh imports of the given modules, and the heavy modules they loaded.'
+    return min((json.loads(check_output([sys.executable, '-c', probe, ','.join(modules), *heavy])) for _ in range(3)), key = lambda r: r[0])
+
+class TestStartup(TestCase):
+
+    def test_budgets(self):
+        'Budgets are multiples of the time to import aridity and diapyr alone, so that they hold on slow machines.'
+        unit, _ = _import(*baseline)
+        for name, budget in budgets.items():
+            module = f"libiot.scripts.{name}"
+            seconds, loaded = _import(module)
+            self.assertEqual([], loaded, module)
+            self.assertLess(seconds, budget * unit, module)
@@ -0,0 +1,133 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .temper import Discovery, query, readall, Temper
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import patch
+import os, struct, tty
+
+class FakeTemper:
+
+    def __init__(self, *centidegrees):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.path = os.ttyname(slave)
+        self.slave = slave
+        self.queries = 0
+        self.centidegrees = centidegrees
+        self.thread = Thread(target = self._serve)
+        self.thread.start()
+
+    def _serve(self):
+        for c in self.centidegrees:
+            data = b''
+            while len(data) < len(query):
+                data += os.read(self.master, len(query) - len(data))
+            assert query == data
+            self.queries += 1
+            os.write(self.master, struct.pack('>2Bh4B', 0x80, 0x02, c, 0, 0, 0, 0))
+
+    def dispose(self):
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+class TestTemper(TestCase):
+
+    def test_read(self):
+        f = FakeTemper(2345)
+        try:
+            self.assertEqual(23.45, Temper(f.path).read())
+        finally:
+            f.dispose()
+
+    def test_sample(self):
+        f = FakeTemper(100, -50, 2000)
+        try:
+            with Temper(f.path).open() as h:
+                readings = h.sample(100)
+                self.assertEqual([1, -.5, 20], [next(readings) for _ in range(3)])
+            self.assertEqual(3, f.queries)
+        finally:
+            f.dispose()
+
+    def test_timeout(self):
+        f = FakeTemper()
+        try:
+            with self.assertRaises(TimeoutError):
+                Temper(f.path, timeout = .05).read()
+        finally:
+            f.dispose()
+
+class TestDiscovery(TestCase):
+
+    def _node(self, root, name, hidname, usbinterface, serial = None):
+        usbdevice = root / 'devices' / usbinterface.split(':')[0]
+        hid = usbdevice / usbinterface / hidname
+        hid.mkdir(parents = True)
+        if serial is not None:
+            (usbdevice / 'serial').write_text(f"{serial}\n")
+        node = root / 'class' / 'hidraw' / name
+        node.mkdir(parents = True)
+        (node / 'device').symlink_to(hid)
+
+    def test_find(self):
+        with TemporaryDirectory() as tempdir:
+            root = Path(tempdir)
+            self._node(root, 'hidraw0', '0003:046D:C52B.0001', '1-1:1.0')
+            self._node(root, 'hidraw1', '0003:0C45:7401.0002', '1-2:1.0')
+            self._node(root, 'hidraw2', '0003:0C45:7401.0003', '1-2:1.1')
+            self._node(root, 'hidraw3', '0003:413D:2107.0004', '1-3.4:1.1', 'ABC123')
+            d = Discovery(root, Path('/dev'), root / 'cache.json')
+            expected = {'1-2': '/dev/hidraw2', 'ABC123': '/dev/hidraw3'}
+            self.assertEqual(expected, d.find())
+            with patch.object(Discovery, '_identify', side_effect = AssertionError):
+                self.assertEqual(expected, d.find())
+            (root / 'class' / 'hidraw' / 'hidraw2' / 'device').unlink()
+            self.assertEqual({'ABC123': '/dev/hidraw3'}, d.find())
+            self._node(root, 'hidraw4', '0003:1A86:E025.0005', '1-4:1.1', 'DEF456')
+            self.assertEqual({'ABC123': '/dev/hidraw3', 'DEF456': '/dev/hidraw4'}, d.find())
+            self.assertEqual({'ABC123': '/dev/hidraw3', 'DEF456': '/dev/hidraw4'}, Discovery(root, Path('/dev'), root / 'cache.json').find())
+
+class TestReadAll(TestCase):
+
+    def test_concurrent(self):
+        fakes = dict(a = FakeTemper(1000), b = FakeTemper(2000), c = FakeTemper())
+        try:
+            handles = {k: Temper(f.path).open() for k, f in fakes.items()}
+            try:
+                self.assertEqual(dict(a = 10, b = 20, c = None), readall(handles, .1))
+            finally:
+                for h in handles.values():
+                    h.dispose()
+        finally:
+            for f in fakes.values():
+                f.dispose()
@@ -0,0 +1,58 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .trace import Tracer
+from unittest import TestCase
+
+class TestTracer(TestCase):
+
+    def test_disabled(self):
+        t = Tracer()
+        with t.scope('dev'), t.phase('connect'):
+            t.attempt()
+        self.assertEqual([], t.events)
+        self.assertEqual({}, t.attempts)
+
+    def test_enabled(self):
+        t = Tracer()
+        t.enabled = True
+        with t.scope('dev'):
+            t.attempt()
+            with t.phase('connect'):
+                pass
+            with self.assertRaises(KeyError), t.phase('notify'):
+                raise KeyError
+            t.attempt()
+        with t.phase('handshake', 'plug'):
+            pass
+        self.assertEqual(dict(dev = 2), t.attempts)
+        self.assertEqual([('dev', 'connect'), ('dev', 'notify'), ('plug', 'handshake')], [(e['device'], e['phase']) for e in t.events])
+        self.assertEqual('KeyError', t.events[1]['error'])
+        h = t.histograms()
+        self.assertEqual({'connect', 'notify', 'handshake'}, h.keys())
+        self.assertEqual({'<=1ms': 1}, h['connect']['buckets'])
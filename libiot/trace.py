@@ -0,0 +1,108 @@
+# Copyright 2021 Andrzej Cichocki
+
+# This file is part of libiot.
+#
+# libiot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# libiot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with libiot.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file incorporates work covered by the following copyright and
+# permission notice:
+
+# Copyright 2020 Toby Johnson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from contextlib import contextmanager, nullcontext
+from threading import local, Lock
+import json, math, time
+
+_disabled = nullcontext()
+
+class Tracer:
+
+    def __init__(self):
+        self.enabled = False
+        self.local = local()
+        self.lock = Lock()
+        self.events = []
+        self.attempts = {}
+
+    def _device(self):
+        return getattr(self.local, 'device', None)
+
+    def scope(self, device):
+        return self._scope(device) if self.enabled else _disabled
+
+    @contextmanager
+    def _scope(self, device):
+        outer = self._device()
+        self.local.device = device
+        try:
+            yield
+        finally:
+            self.local.device = outer
+
+    def phase(self, name, device = None):
+        return self._phase(name, device) if self.enabled else _disabled
+
+    @contextmanager
+    def _phase(self, name, device):
+        start = time.time()
+        t = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            event = dict(device = self._device() if device is None else device, phase = name, start = start, seconds = time.perf_counter() - t)
+            if error is not None:
+                event['error'] = error
+            with self.lock:
+                self.events.append(event)
+
+    def attempt(self):
+        if self.enabled:
+            device = self._device()
+            with self.lock:
+                self.attempts[device] = self.attempts.get(device, 0) + 1
+
+    def histograms(self):
+        histograms = {}
+        with self.lock:
+            events = list(self.events)
+        for event in events:
+            seconds = event['seconds']
+            h = histograms.setdefault(event['phase'], dict(count = 0, total = 0, max = 0, buckets = {}))
+            h['count'] += 1
+            h['total'] += seconds
+            h['max'] = max(h['max'], seconds)
+            bound = 2 ** max(0, math.ceil(math.log2(max(seconds * 1000, 1))))
+            h['buckets'][bound] = h['buckets'].get(bound, 0) + 1
+        for h in histograms.values():
+            h['buckets'] = {f"<={bound}ms": n for bound, n in sorted(h['buckets'].items())}
+        return histograms
+
+    def dump(self, path):
+        with self.lock:
+            events = list(self.events)
+            attempts = {str(k): n for k, n in self.attempts.items()}
+        with open(path, 'w') as f:
+            json.dump(dict(events = events, attempts = attempts, histograms = self.histograms()), f, indent = 1)
+
+tracer = Tracer()
@@ -26,16 +26,15 @@
 #
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+from .trace import tracer
 from aridity.config import Config
 from base64 import b64decode, b64encode
-from Crypto.Cipher import AES
 from diapyr import types
 from diapyr.util import innerclass, singleton
 from hashlib import sha256
-from lagoon.util import atomic
 from pathlib import Path
 from pkcs7 import PKCS7Encoder
-from requests.exceptions import ConnectionError, ReadTimeout
+from threading import Lock
 import json, logging, pickle, time
 
 log = logging.getLogger(__name__)
@@ -45,7 +44,7 @@ class Persistent:
     cacheroot = Path.home() / '.cache' / 'libiot'
 
     @classmethod
-    def loadorcreate(cls, relpath, args, *context):
+    def loadcached(cls, relpath, *context):
         try:
             with (cls.cacheroot / relpath).open('rb') as f:
                 log.debug("Load cached: %s", relpath)
@@ -54,12 +53,19 @@ class Persistent:
                     return obj
         except FileNotFoundError:
             pass
+
+    @classmethod
+    def loadorcreate(cls, relpath, args, *context):
+        obj = cls.loadcached(relpath, *context)
+        if obj is not None:
+            return obj
         log.debug("Generate: %s", relpath)
         obj = cls(*args)
         obj.persist(relpath)
         return obj
 
     def persist(self, relpath):
+        from lagoon.util import atomic
         with atomic(self.cacheroot / relpath) as p, p.open('wb') as f:
             pickle.dump(self, f)
 
@@ -111,6 +117,7 @@ class Cipher:
         self.iv = iv
 
     def _aes(self):
+        from Crypto.Cipher import AES
         return AES.new(self.key, AES.MODE_CBC, self.iv)
 
     def encrypt(self, obj):
@@ -129,6 +136,7 @@ class KLAPCipher:
             self.seq = seq
 
         def _aes(self):
+            from Crypto.Cipher import AES
             return AES.new(self.key, AES.MODE_CBC, self.iv + self.seqbytes)
 
         def encrypt(self, obj):
@@ -144,9 +152,20 @@ class KLAPCipher:
         self.iv = ivdata[:12]
         self.seq = int.from_bytes(ivdata[-4:], 'big', signed = True)
         self.sig = dig(sha256, b'ldk' + blob)[:28]
+        self.lock = Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
 
     def channel(self):
-        self.seq = seq = self.seq + 1
+        with self.lock:
+            self.seq = seq = self.seq + 1
         return self.Channel(seq)
 
 def dig(h, v):
@@ -156,7 +175,10 @@ class AbortException(Exception): pass
 
 class Retry:
 
-    abortexceptions = AbortException, ConnectionError, ReadTimeout
+    @property
+    def abortexceptions(self):
+        from requests.exceptions import ConnectionError, ReadTimeout
+        return AbortException, ConnectionError, ReadTimeout
 
     @types(Config)
     def __init__(self, config):
@@ -169,6 +191,7 @@ class Retry:
     def __call__(self, f):
         keepgoing = True
         while keepgoing:
+            tracer.attempt()
             try:
                 return f()
             except self.abortexceptions: